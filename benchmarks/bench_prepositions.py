@@ -0,0 +1,41 @@
+"""
+Microbenchmark for the preposition matcher.
+
+Compares the compiled alternation in Lemmatizer.match_preposition with the
+old loop which built one regex per pattern for every token.
+
+    $ python benchmarks/bench_prepositions.py
+"""
+import csv
+from pathlib import Path
+import re
+import timeit
+from gd_tools.core import Lemmatizer
+
+def loop_match(prepositions: dict, surface: str) -> str:
+    """The pre-0.2 matcher."""
+    for pattern in prepositions:
+        if re.match("^("+pattern+")$", surface):
+            return prepositions[pattern]
+    return None
+
+def main(number: int = 20):
+    lemmatizer = Lemmatizer()
+    path = Path(__file__).parent.parent / "tests" / "resources" / "test_prepositions.csv"
+    with open(path, encoding="utf-8") as file:
+        reader = csv.reader(file)
+        next(reader)
+        words = [line[0] for line in reader]
+    for word in words:
+        assert loop_match(lemmatizer.prepositions, word) == lemmatizer.match_preposition(word), word
+    loop = min(timeit.repeat(lambda: [loop_match(lemmatizer.prepositions, w) for w in words],
+                             number=number, repeat=5))
+    compiled = min(timeit.repeat(lambda: [lemmatizer.match_preposition(w) for w in words],
+                                 number=number, repeat=5))
+    tokens = number * len(words)
+    print(f"loop:     {tokens / loop:12.0f} tokens/s")
+    print(f"compiled: {tokens / compiled:12.0f} tokens/s")
+    print(f"speedup:  {loop / compiled:12.1f}x")
+
+if __name__ == "__main__":
+    main()
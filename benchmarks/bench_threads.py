@@ -0,0 +1,77 @@
+"""
+Thread scaling benchmark.
+
+Times one shared Lemmatizer_xpos called from a pool of threads, as in a threaded web
+service, and BatchAnnotator with a thread pool, at each thread count. On a build with
+the GIL the threads take turns, so only the free-threaded build should scale.
+
+    $ python benchmarks/bench_threads.py
+    $ python3.13t benchmarks/bench_threads.py --threads 1 2 4 8 16
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import random
+import sys
+import time
+from gd_tools.batch import BatchAnnotator
+from gd_tools.core import Lemmatizer_xpos
+from gd_tools.registry import Registry
+from gd_tools.ud import Features
+
+XPOSES = ["Ncsmn", "Ncsfg", "Ncpmn", "Nv", "Aq-smn", "V-s", "V-f", "Sp"]
+
+def distinct_types(count: int, seed: int = 1) -> list:
+    """(form, XPOS) pairs from lemmata.csv which are all different, so nothing is deduplicated."""
+    pairs = [(form, xpos) for form in Registry.shared().lemmata() for xpos in XPOSES]
+    random.Random(seed).shuffle(pairs)
+    return pairs[:count]
+
+def best(function, repeats: int = 3) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def shared(lemmatizer: Lemmatizer_xpos, pairs: list, threads: int) -> float:
+    """Seconds for threads to lemmatize equal slices of pairs with one lemmatizer."""
+    size = -(-len(pairs) // threads)
+    slices = [pairs[start:start + size] for start in range(0, len(pairs), size)]
+    def work(part):
+        for form, xpos in part:
+            lemmatizer.lemmatize(form, xpos)
+    with ThreadPoolExecutor(threads) as executor:
+        return best(lambda: list(executor.map(work, slices)))
+
+def batched(lemmatizer: Lemmatizer_xpos, pairs: list, threads: int) -> float:
+    """Seconds for BatchAnnotator with threads to give the lemmas and FEATS of pairs."""
+    batch = BatchAnnotator(lemmatizer, Features(), threads=threads)
+    forms, xposes = [form for form, _ in pairs], [xpos for _, xpos in pairs]
+    try:
+        return best(lambda: batch.annotate(forms, xposes))
+    finally:
+        batch.close()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=100000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args(argv)
+    gil = sys._is_gil_enabled() if hasattr(sys, "_is_gil_enabled") else True
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}")
+    pairs = distinct_types(args.tokens)
+    lemmatizer = Lemmatizer_xpos(index=False)
+    for form, xpos in pairs:
+        lemmatizer.lemmatize(form, xpos)
+    print(f"{'threads':>7} {'shared tokens/s':>16} {'batch tokens/s':>16}")
+    base = None
+    for threads in args.threads:
+        shared_rate = len(pairs) / shared(lemmatizer, pairs, threads)
+        batch_rate = len(pairs) / batched(lemmatizer, pairs, threads)
+        base = base or shared_rate
+        print(f"{threads:7} {shared_rate:16.0f} {batch_rate:16.0f}   {shared_rate / base:.2f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
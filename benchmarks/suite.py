@@ -0,0 +1,199 @@
+"""
+Reproducible benchmark suite for the annotators.
+
+Generates a synthetic ARCOSG-style corpus from the test CSVs, times each annotator on it,
+writes the results to JSON and compares them with a stored baseline.
+
+    $ python benchmarks/suite.py --output results.json
+    $ python benchmarks/suite.py --update-baseline
+
+Exits with status 1 if anything is slower than the baseline by more than the tolerance.
+Timings depend on the machine, so regenerate the baseline on the machine used for releases.
+"""
+import argparse
+import csv
+import json
+from pathlib import Path
+import random
+import re
+import sys
+import time
+import tracemalloc
+from gd_tools.batch import BatchAnnotator
+from gd_tools.ccg import CCGRetagger, CCGTyper, Subcat
+from gd_tools.core import GOC, Lemmatizer_xpos
+from gd_tools.registry import Registry
+from gd_tools.ud import Features
+
+HERE = Path(__file__).parent
+TEST_RESOURCES = HERE.parent / "tests" / "resources"
+BASELINE = HERE / "baseline.json"
+REPEATS = 5
+
+FUNCTION_WORDS = [("a", "Sa"), ("ag", "Sa"), ("an", "Tdsm"), ("na", "Tdpfg"), ("agus", "Cc"),
+                  ("'s", "Cc"), ("gun", "Qa"), ("cha", "Qn"), ("is", "Wp-i"), ("tha", "V-p"),
+                  ("bha", "V-s"), ("e", "Pp3sm"), ("i", "Pp3sf"), ("mi", "Pp1s"), (",", "Fi"),
+                  (".", "Fe"), ("air", "Sp"), ("le", "Sp"), ("ann", "Sp"), ("a", "Dp3sm")]
+
+def types_from_tests() -> list:
+    """Distinct (form, XPOS) pairs from the test files and a few frequent function words."""
+    pairs = list(FUNCTION_WORDS)
+    for filename in ["test_nouns.csv", "test_verbs.csv", "test_adjectives.csv"]:
+        with open(TEST_RESOURCES / filename, encoding="utf-8") as file:
+            reader = csv.reader(file)
+            next(reader)
+            pairs += [(row[0], row[1]) for row in reader]
+    for filename, xpos in [("test_prepositions.csv", "Sp"), ("test_verbal_nouns.csv", "Nv")]:
+        with open(TEST_RESOURCES / filename, encoding="utf-8") as file:
+            reader = csv.reader(file)
+            next(reader)
+            pairs += [(row[0], xpos) for row in reader]
+    return list(dict.fromkeys(pairs))
+
+def corpus(tokens: int, seed: int = 1) -> list:
+    """
+    Zipfian sample of (form, XPOS) pairs, so that repeats are as common as in real text.
+    The same seed always gives the same corpus.
+    """
+    pairs = types_from_tests()
+    rng = random.Random(seed)
+    rng.shuffle(pairs)
+    weights = [1 / rank for rank in range(1, len(pairs) + 1)]
+    return rng.choices(pairs, weights=weights, k=tokens)
+
+def measure(function, tokens: int) -> dict:
+    """
+    Reports throughput from the best of REPEATS untraced runs, then peak memory from a
+    traced run, because tracing slows everything down.
+    """
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    elapsed = min(timings)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"tokens_per_sec": tokens / elapsed if elapsed else 0.0,
+            "peak_kb": peak / 1024}
+
+def startup() -> dict:
+    """
+    Best time over REPEATS cold loads of every resource and annotator, with the regular
+    expression cache emptied each time, and peak memory for a further, traced load.
+    """
+    def load():
+        registry = Registry()
+        registry.load_all()
+        CCGRetagger(resources=registry)
+        CCGTyper(resources=registry)
+        Features()
+        GOC()
+        return registry
+    timings = []
+    for _ in range(REPEATS):
+        re.purge()
+        start = time.perf_counter()
+        registry = load()
+        timings.append(time.perf_counter() - start)
+    elapsed = min(timings)
+    tracemalloc.start()
+    load()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"startup_ms": elapsed * 1000, "peak_kb": peak / 1024,
+            "resources": registry.report()}
+
+def run(tokens: int = 50000, seed: int = 1) -> dict:
+    """All measurements for one corpus."""
+    pairs = corpus(tokens, seed)
+    lemmatizer = Lemmatizer_xpos()
+    features = Features()
+    retagger = CCGRetagger(Subcat(lemmatizer))
+    typer = CCGTyper()
+    goc = GOC()
+    tags = [retagger.retag(form, xpos)[0] for form, xpos in pairs]
+
+    def lemmatize():
+        for form, xpos in pairs:
+            lemmatizer.lemmatize(form, xpos)
+
+    def featurise():
+        prev_xpos = ""
+        for _, xpos in pairs:
+            features.feats(xpos, {}, prev_xpos)
+            prev_xpos = xpos
+
+    def retag():
+        for form, xpos in pairs:
+            retagger.retag(form, xpos)
+
+    def type_():
+        for (form, xpos), tag in zip(pairs, tags):
+            typer.type(form, xpos.replace("*", ""), tag)
+
+    def normalise():
+        for form, _ in pairs:
+            goc.normalise(form)
+
+    batch = BatchAnnotator(lemmatizer, features)
+    forms, xposes = [form for form, _ in pairs], [xpos for _, xpos in pairs]
+
+    def batched():
+        batch.annotate(forms, xposes)
+
+    cold = startup()
+    results = {"tokens": tokens, "seed": seed, "python": sys.version.split()[0],
+               "startup_ms": cold["startup_ms"], "startup_peak_kb": cold["peak_kb"],
+               "resources": cold["resources"], "annotators": {}}
+    for name, function in [("lemmatize", lemmatize), ("feats", featurise), ("retag", retag),
+                           ("type", type_), ("normalise", normalise), ("batch", batched)]:
+        results["annotators"][name] = measure(function, tokens)
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Descriptions of every measurement which is worse than baseline by more than tolerance."""
+    regressions = []
+    for name, current in results["annotators"].items():
+        before = baseline.get("annotators", {}).get(name)
+        if before and current["tokens_per_sec"] < before["tokens_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {current['tokens_per_sec']:.0f} tokens/s, "
+                               f"baseline {before['tokens_per_sec']:.0f}")
+    if "startup_ms" in baseline and \
+            results["startup_ms"] > baseline["startup_ms"] * (1 + tolerance):
+        regressions.append(f"startup: {results['startup_ms']:.1f}ms, "
+                           f"baseline {baseline['startup_ms']:.1f}ms")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="where to write the results as JSON")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fraction by which a measurement may be worse than the baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+    results = run(args.tokens, args.seed)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    if args.update_baseline:
+        Path(args.baseline).write_text(text + "\n", encoding="utf-8")
+        return 0
+    for name, result in results["annotators"].items():
+        print(f"{name:10} {result['tokens_per_sec']:12.0f} tokens/s {result['peak_kb']:10.0f} KiB")
+    print(f"{'startup':10} {results['startup_ms']:12.1f} ms       {results['startup_peak_kb']:10.0f} KiB")
+    if not Path(args.baseline).exists():
+        return 0
+    regressions = compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")),
+                          args.tolerance)
+    for regression in regressions:
+        print("REGRESSION", regression, file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
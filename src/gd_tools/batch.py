@@ -0,0 +1,152 @@
+"""
+Column-oriented batch annotation.
+
+Most (form, XPOS) pairs in a sentence or a document occur more than once, so each annotator
+is run once per distinct type and the results are scattered back to token order.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from typing import Optional, Sequence
+from gd_tools.ccg import CCGRetagger, CCGTyper, Subcat
+from gd_tools.core import Lemmatizer_xpos
+from gd_tools.ud import Features
+
+class BatchAnnotator:
+    """
+    Annotates parallel columns of forms and XPOS tags.
+
+    Annotators are built on first use; pass them in to share ones that already exist.
+    An XPOS of None means the token is untagged: it gets a lemma and None for everything else.
+
+    One BatchAnnotator can be shared between threads. With threads above 1, the distinct
+    types of each call are split between a pool of that many threads, which pays off on
+    free-threaded builds; close() shuts the pool down.
+    """
+    annotations = ("lemma", "feats", "retag", "type", "readings")
+
+    def __init__(self, lemmatizer: Optional[Lemmatizer_xpos] = None,
+                 featuriser: Optional[Features] = None,
+                 retagger: Optional[CCGRetagger] = None,
+                 typer: Optional[CCGTyper] = None, threads: int = 1):
+        self.lemmatizer = lemmatizer or Lemmatizer_xpos()
+        self.featuriser = featuriser
+        self.retagger = retagger
+        self.typer = typer
+        self.threads = threads
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def close(self):
+        """Shuts down the thread pool, if there is one."""
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    @staticmethod
+    def previous(xposes: Sequence[Optional[str]], starts: Sequence[int] = (0,)) -> list:
+        """
+        The XPOS before each token, skipping untagged ones, as Features.feats expects.
+        starts are the indices at which sentences begin; nothing precedes those.
+        """
+        starts = set(starts)
+        result = []
+        prev_xpos = ""
+        for i, xpos in enumerate(xposes):
+            if i in starts:
+                prev_xpos = ""
+            result.append(prev_xpos)
+            if xpos is not None:
+                prev_xpos = xpos
+        return result
+
+    @staticmethod
+    def feats_key(xpos: str, feats: dict, prev_xpos: str) -> tuple:
+        """The inputs that Features.feats depends on for this XPOS."""
+        if xpos == "Nv":
+            return (xpos, prev_xpos, ())
+        if xpos.startswith("N"):
+            return (xpos, "", ("Typo" in feats,))
+        if xpos.startswith("M"):
+            return (xpos, "", tuple(sorted((key, tuple(value)) for key, value in feats.items())))
+        return (xpos, "", ())
+
+    def annotate(self, forms: Sequence[str], xposes: Sequence[Optional[str]],
+                 feats: Optional[Sequence[dict]] = None,
+                 prev_xposes: Optional[Sequence[str]] = None,
+                 tags: Optional[Sequence[str]] = None,
+                 annotations: Sequence[str] = ("lemma", "feats")) -> dict:
+        """
+        Returns a list in token order for each of the requested annotations.
+
+        feats are the existing FEATS of each token, which matter for Typo and numerals.
+        prev_xposes default to previous(xposes), treating the columns as one sentence.
+        "type" needs a CCG tag per token in tags.
+        "readings" ignores the XPOS and gives every (XPOS family, lemma) reading of the form.
+        Values are shared between tokens of the same type: lemmas are strings, FEATS
+        read-only mappings and retaggings, types and readings tuples.
+        """
+        if len(forms) != len(xposes):
+            raise ValueError(f"{len(forms)} forms but {len(xposes)} XPOS tags")
+        unknown = set(annotations) - set(self.annotations)
+        if unknown:
+            raise ValueError(f"unknown annotations {sorted(unknown)}")
+        result = {}
+        if "lemma" in annotations:
+            result["lemma"] = self.scatter(
+                list(zip(forms, xposes)), lambda key: self.lemmatizer.lemmatize(*key))
+        if "feats" in annotations:
+            with self.lock:
+                if self.featuriser is None:
+                    self.featuriser = Features()
+            if prev_xposes is None:
+                prev_xposes = self.previous(xposes)
+            feats = feats or [{}] * len(xposes)
+            keys = [None if xpos is None else self.feats_key(xpos, token_feats, prev_xpos)
+                    for xpos, token_feats, prev_xpos in zip(xposes, feats, prev_xposes)]
+            values = {}
+            for key, xpos, token_feats, prev_xpos in zip(keys, xposes, feats, prev_xposes):
+                if key is not None and key not in values:
+                    values[key] = self.featuriser.feats(xpos, token_feats, prev_xpos)
+            result["feats"] = [None if key is None else values[key] for key in keys]
+        if "retag" in annotations:
+            with self.lock:
+                if self.retagger is None:
+                    self.retagger = CCGRetagger(Subcat(self.lemmatizer))
+            result["retag"] = self.scatter(
+                [None if xpos is None else (form, xpos) for form, xpos in zip(forms, xposes)],
+                lambda key: self.retagger.retag_tuple(*key))
+        if "type" in annotations:
+            if tags is None:
+                raise ValueError("type needs a CCG tag for each token")
+            with self.lock:
+                if self.typer is None:
+                    self.typer = CCGTyper()
+            result["type"] = self.scatter(
+                [None if xpos is None else (form, xpos.replace("*", ""), tag)
+                 for form, xpos, tag in zip(forms, xposes, tags)],
+                lambda key: self.typer.type(*key))
+        if "readings" in annotations:
+            result["readings"] = self.scatter(list(forms), self.lemmatizer.lemmatize_readings)
+        return result
+
+    def scatter(self, keys: list, function) -> list:
+        """Applies function once per distinct key and returns the results in key order."""
+        distinct = list(dict.fromkeys(key for key in keys if key is not None))
+        if self.threads > 1 and len(distinct) > 1:
+            values = dict(zip(distinct, self.map(function, distinct)))
+        else:
+            values = {key: function(key) for key in distinct}
+        return [None if key is None else values[key] for key in keys]
+
+    def map(self, function, keys: list) -> list:
+        """function of each key, with the keys split evenly between the thread pool."""
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.threads)
+        size = -(-len(keys) // self.threads)
+        chunks = [keys[start:start + size] for start in range(0, len(keys), size)]
+        result = []
+        for values in self.executor.map(lambda chunk: [function(key) for key in chunk], chunks):
+            result.extend(values)
+        return result
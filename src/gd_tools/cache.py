@@ -0,0 +1,111 @@
+"""
+Sentence cache for incremental re-annotation.
+
+Stores the LEMMA and FEATS columns that Annotator gave each sentence in an SQLite file,
+keyed by a hash of the sentence's FORM, XPOS and FEATS columns. Rebuilding a corpus then
+only annotates the sentences which changed. Everything in the cache belongs to one
+fingerprint of the resources, the code and the options; opening it with another
+fingerprint empties it.
+
+    $ gd-tools annotate --cache treebank.cache in.conllu out.conllu
+"""
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+from typing import Optional
+from gd_tools.conllu import FEATS, FORM, LEMMA, XPOS, is_word
+from gd_tools.registry import Registry
+
+class AnnotationCache:
+    """
+    SQLite table from sentence hash to LEMMA and FEATS.
+
+    Each process should open its own AnnotationCache; SQLite serialises their writes.
+    hits and misses count sentences.
+    """
+    batch_size = 500
+
+    def __init__(self, path, fingerprint: str):
+        self.path = path
+        self.connection = sqlite3.connect(str(path), timeout=60)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS sentences (key TEXT PRIMARY KEY, annotation TEXT)")
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+            if row is None or row[0] != fingerprint:
+                self.connection.execute("DELETE FROM sentences")
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint_of(resources: Optional[Registry] = None, lexicon: Optional[str] = None,
+                       split: bool = False) -> str:
+        """
+        SHA-256 over everything besides the sentence that annotation depends on: the resource
+        files, the gd_tools source, the lexicon file if any and whether fused tokens are split.
+        """
+        digest = hashlib.sha256()
+        digest.update((resources or Registry.shared()).fingerprint().encode("ascii"))
+        for path in sorted(Path(__file__).parent.glob("*.py")):
+            digest.update(path.name.encode("utf-8"))
+            digest.update(hashlib.sha256(path.read_bytes()).digest())
+        if lexicon is not None:
+            with open(lexicon, "rb") as file:
+                for block in iter(lambda: file.read(1 << 20), b""):
+                    digest.update(block)
+        digest.update(b"split" if split else b"whole")
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(words: list) -> str:
+        """Hash of the FORM, XPOS and FEATS of a sentence's words."""
+        text = "\n".join(f"{line[FORM]}\t{line[XPOS]}\t{line[FEATS]}" for line in words)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def fill(self, sentences: list) -> list:
+        """
+        Fills in LEMMA and FEATS of every sentence in the cache, in place.
+        Returns (key, words) for the others, to be annotated and passed to store.
+        """
+        pending = []
+        for sentence in sentences:
+            words = [line for line in sentence if is_word(line)]
+            pending.append((self.key(words), words))
+        found = {}
+        keys = list({key for key, _ in pending})
+        for start in range(0, len(keys), self.batch_size):
+            part = keys[start:start + self.batch_size]
+            found.update(self.connection.execute(
+                f"SELECT key, annotation FROM sentences WHERE key IN ({','.join('?' * len(part))})",
+                part))
+        misses = []
+        for key, words in pending:
+            annotation = found.get(key)
+            if annotation is None:
+                misses.append((key, words))
+                continue
+            for line, (lemma, feats) in zip(words, json.loads(annotation)):
+                line[LEMMA] = lemma
+                line[FEATS] = feats
+        self.hits += len(pending) - len(misses)
+        self.misses += len(misses)
+        return misses
+
+    def store(self, misses: list):
+        """Records the annotated sentences returned by fill."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO sentences VALUES (?, ?)",
+                [(key, json.dumps([(line[LEMMA], line[FEATS]) for line in words],
+                                  ensure_ascii=False))
+                 for key, words in misses])
+
+    def close(self):
+        self.connection.close()
@@ -1,22 +1,30 @@
 """Mixture of generically-useful classes, UD-specific ones and CCG-specific ones."""
+import hashlib
+import json
 import os
 from pathlib import Path
-import re
-import csv
+import sys
+import threading
+from typing import Optional, Sequence
+from gd_tools.core import LRUCache
 from gd_tools.core import Lemmatizer
 from gd_tools.core import Lemmatizer_xpos
 from gd_tools.core import Morphology
+from gd_tools.registry import Registry
 
 class CCGRetagger:
-    """Relies on the subcategoriser, largely."""
-    def __init__(self):
-        self.sub = Subcat()
-        self.retaggings = {}
-        with open(Path(__file__).parent / 'resources/retaggings.txt') as file:
-            for line in file:
-                if not line.startswith("#"):
-                    tokens = line.split('\t')
-                    self.retaggings[tokens[0]] = tokens[1].strip()
+    """
+    Relies on the subcategoriser, largely.
+
+    Pass in a Subcat to share its lemmatizer; tables come from the shared Registry.
+    Tags are memoized per surface and XPOS in an LRUCache of cache_size entries,
+    unless cache_size is None. One instance can be shared between threads.
+    """
+    def __init__(self, sub: "Subcat" = None, resources: Registry = None,
+                 cache_size: Optional[int] = 65536):
+        self.resources = resources or Registry.shared()
+        self.sub = sub or Subcat(resources=self.resources)
+        self.retaggings = self.resources.retaggings()
         self.specials = {
             'Mgr':['FIRSTNAME'], "Mghr":['FIRSTNAME'],
             'Dh’':['ADVPRE'], "Dh'":['ADVPRE'],
@@ -34,6 +42,10 @@ class CCGRetagger:
             'riaghladair':['NAME'],
             'dè':['INTERRDE'], 'i':['PRONOUN']
         }
+        self.cache = None
+        if cache_size is not None:
+            self.cache = LRUCache(cache_size)
+            self.retag_tuple = self.cache.wrap(self.retag_tuple)
 
     @staticmethod
     def retag_article(xpos):
@@ -45,68 +57,94 @@ class CCGRetagger:
         return self.sub.subcat_tuple(surface, xpos)
 
     def retag(self, surface, rawpos):
-        """Relies on surface and xpos."""
+        """Relies on surface and xpos. Returns a fresh list, so callers may change it."""
+        return list(self.retag_tuple(surface, rawpos))
+
+    def retag_tuple(self, surface, rawpos) -> tuple:
+        """The tags for surface and xpos, as a tuple which may be shared."""
         # assume it was meant all along
         pos = rawpos.replace('*','')
         if surface.lower() in self.specials:
-            return self.specials[surface.lower()]
+            return tuple(self.specials[surface.lower()])
         # separate mechanism for verbs
         if pos.startswith('Nv') or pos.startswith('V') or pos.startswith('W'):
-            return self.retag_verb(surface, pos)
+            return tuple(self.retag_verb(surface, pos))
         # and articles
         if pos.upper().startswith('T'):
-            return self.retag_article(pos)
+            return tuple(self.retag_article(pos))
         if pos in self.retaggings:
-            return [self.retaggings[pos]]
+            return (self.retaggings[pos],)
         # for cases where we are not using all of the features
-        return [self.retaggings[pos[0:2]]]
+        return (self.retaggings[pos[0:2]],)
+
+    def retag_sentence(self, forms: Sequence[str], xposes: Sequence[Optional[str]]) -> list:
+        """
+        Supertag candidates for each word of a sentence, for instance for supertagger
+        training data. Untagged words get None.
+        """
+        return [None if xpos is None else self.retag(form, xpos)
+                for form, xpos in zip(forms, xposes)]
+
+    def cache_info(self) -> dict:
+        return {} if self.cache is None else self.cache.info()
 
 class Subcat:
-    """Assigns subcategories based on lemmata."""
-    def __init__(self):
-        self.lemmatizer = Lemmatizer_xpos()
-        self.mappings = {}
-        self.mappings['default'] = ['TRANS', 'INTRANS']
-        subcats = []
-        with open(Path(__file__).parent / 'resources/subcat.txt') as file:
-            for line in file:
-                if not line.startswith('#'):
-                    if re.match('^[0-9]', line):
-                        tokens = line.split()
-                        subcats = [t.strip() for t in tokens[1:]]
-                    else:
-                        self.mappings[line.strip()] = subcats
+    """
+    Assigns subcategories based on lemmata.
+
+    Pass in a Lemmatizer_xpos to share one that already exists.
+    """
+    def __init__(self, lemmatizer: Lemmatizer_xpos = None, resources: Registry = None):
+        self.resources = resources or Registry.shared()
+        self.lemmatizer = lemmatizer or Lemmatizer_xpos(resources=self.resources)
+        self.mappings = self.resources.subcat()
+        self.default = self.mappings["default"]
 
     def subcat_tuple(self, surface, pos):
         """Wrapper for subcat. Relies on lemmatizer."""
         return self.subcat(self.lemmatizer.lemmatize(surface, pos))
 
     def subcat(self, lemma):
-        """Relies on lemma."""
-        if lemma in self.mappings.keys():
-            return self.mappings[lemma]
-        return self.mappings["default"]
+        """Relies on lemma. Returns a fresh list, so callers may change it."""
+        return list(self.mappings.get(lemma, self.default))
 
 
 class CCGTyper:
-    """Adds CCG features"""
-    def __init__(self):
+    """
+    Adds CCG features.
+
+    A verb's type depends only on its tag, its XPOS and whether it starts with a vowel
+    or f, so each combination is worked out once and kept, with the strings interned.
+    Types are added under a lock, so one instance can be shared between threads.
+    """
+    clausetypes = {"p":"dcl","s":"dcl","f":"dcl","r":"rel","d":"dep"}
+    vowels = frozenset("aeiouàèìòù")
+
+    def __init__(self, resources: Registry = None):
         """Adds CCG features"""
-        self.types = {}
-        with open(Path(__file__).parent / 'resources/types.txt') as file:
-            for line in file:
-                if not line.startswith("#"):
-                    tokens = line.split('\t')
-                    self.types[tokens[0]] = tokens[1].strip()
+        self.resources = resources or Registry.shared()
+        self.types = self.resources.types()
+        self.lock = threading.Lock()
+        self.verb_types = {}
 
     def type_verb(self, surface, pos, tag):
         """Adds CCG features"""
-        clausetypes = {"p":"dcl","s":"dcl","f":"dcl","r":"rel","d":"dep"}
-        clausetype = clausetypes[pos[-1]] if pos[-1] in clausetypes \
+        phon = "vowel" if surface[:1] in self.vowels or surface.startswith("f") else "cons"
+        key = (tag, pos, phon)
+        result = self.verb_types.get(key)
+        if result is None:
+            with self.lock:
+                result = self.verb_types.get(key)
+                if result is None:
+                    result = self.verb_types[key] = self.build_verb_type(tag, pos, phon)
+        return result
+
+    def build_verb_type(self, tag, pos, phon):
+        """Works out the tag and type of a verb from scratch."""
+        clausetype = self.clausetypes[pos[-1]] if pos[-1] in self.clausetypes \
             else "small" if pos == "Nv" else "imp"
         tense = "pres" if "p" in pos else "past" if "s" in pos \
             else "fut" if "f" in pos else "hab" if "h" in pos else None
-        phon = "vowel" if re.match("^[aeiouàèìòù]", surface) or surface.startswith("f") else "cons"
         features = (clausetype if tense is None else f"{clausetype} {tense}") + f" {phon}"
         newtag = tag + features.upper().replace(' ','')
         ccg_type = self.types[tag] % features
@@ -114,10 +152,116 @@ class CCGTyper:
             newtag = newtag + "IMPERS"
         else:
             ccg_type = ccg_type + "/n"
-        return (newtag, ccg_type)
+        return (sys.intern(newtag), sys.intern(ccg_type))
 
     def type(self, surface, pos, tag):
         """Retypes it as a verb if it's a verb, copula or verbal noun."""
         if pos.startswith("V") or pos.startswith("W") or pos == "Nv":
             return self.type_verb(surface, pos, tag)
         return (tag, self.types[tag])
+
+
+class GrammarExporter:
+    """
+    Writes an OpenCCG grammar in the .ccg format read by ccg2xml, which turns it into
+    the lexicon, morph, rules and types files.
+
+    The grammar is made of fragments, each written to its own file in the output folder:
+    features and rules are copied from features.txt and rules.txt, families come from
+    types.txt with each verbal category expanded by CCGTyper, and words from subcat.txt.
+    manifest.json records a hash of the inputs of each fragment, and export only rebuilds
+    the fragments whose inputs have changed. Bump version when the output format changes.
+    """
+    version = 1
+    fragments = {"features": ("features.txt",), "rules": ("rules.txt",),
+                 "families": ("types.txt",), "words": ("types.txt", "subcat.txt")}
+    # One XPOS for each kind of verb in ARCOSG; CCGTyper decides what each one becomes.
+    verb_xposes = ("V-p", "V-s", "V-f", "V-h", "V-p--d", "V-s--d", "V-f--d", "V-h--d",
+                   "V-f--r", "V-s0", "V-f0", "V-p0-d", "V-h1p", "V-h1pd", "Vm-2s", "Nv")
+
+    def __init__(self, typer: CCGTyper = None, resources: Registry = None):
+        self.resources = resources or Registry.shared()
+        self.typer = typer or CCGTyper(self.resources)
+
+    def digest(self, name: str) -> str:
+        """Hash of everything the fragment called name is made from."""
+        digest = hashlib.sha256(f"{self.version} {name} {self.verb_xposes}".encode("utf-8"))
+        for filename in self.fragments[name]:
+            digest.update((self.resources.folder / filename).read_bytes())
+        return digest.hexdigest()
+
+    def export(self, folder) -> dict:
+        """
+        Brings the grammar in folder up to date and returns, for each fragment,
+        whether it was "built" or "cached". grammar.ccg includes every fragment.
+        """
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        manifest_path = folder / "manifest.json"
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            manifest = {}
+        result = {}
+        for name in self.fragments:
+            digest = self.digest(name)
+            path = folder / f"{name}.ccg"
+            if manifest.get(name) == digest and path.exists():
+                result[name] = "cached"
+                continue
+            GrammarExporter.write(path, getattr(self, f"build_{name}")())
+            manifest[name] = digest
+            result[name] = "built"
+        grammar = folder / "grammar.ccg"
+        if "built" in result.values() or not grammar.exists():
+            GrammarExporter.write(grammar, "".join(
+                (folder / f"{name}.ccg").read_text(encoding="utf-8") for name in self.fragments))
+        GrammarExporter.write(manifest_path, json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+        return result
+
+    @staticmethod
+    def write(path: Path, text: str):
+        """Replaces path atomically, so an interrupted export leaves no half-written file."""
+        temporary = path.with_name(path.name + ".tmp")
+        temporary.write_text(text, encoding="utf-8")
+        os.replace(temporary, path)
+
+    def read(self, filename: str) -> str:
+        text = (self.resources.folder / filename).read_text(encoding="utf-8")
+        return text if text.endswith("\n") else text + "\n"
+
+    def build_features(self) -> str:
+        return self.read("features.txt")
+
+    def build_rules(self) -> str:
+        return self.read("rules.txt")
+
+    def verb_families(self, tag: str, surfaces: tuple = ("a", "b")) -> dict:
+        """
+        Family name to category for every expansion of the verbal tag.
+        By default both a vowel-initial and a consonant-initial verb are expanded.
+        """
+        return dict(self.typer.type_verb(surface, xpos, tag)
+                    for xpos in self.verb_xposes for surface in surfaces)
+
+    def build_families(self) -> str:
+        """One family per tag, or per expansion of a verbal tag."""
+        lines = []
+        for tag, category in self.typer.types.items():
+            if "%s" in category:
+                for family, expanded in self.verb_families(tag).items():
+                    lines.append(f"family {family} {{ entry: {expanded}; }}\n")
+            else:
+                lines.append(f"family {tag} {{ entry: {category}; }}\n")
+        return "".join(lines)
+
+    def build_words(self) -> str:
+        """Each verb in subcat.txt with the families of all its frames, for its initial sound."""
+        lines = []
+        for lemma, frames in self.resources.subcat().items():
+            if lemma == "default":
+                continue
+            families = [family for frame in frames
+                        for family in self.verb_families(frame, (lemma,))]
+            lines.append(f"word {lemma}: {', '.join(families)};\n")
+        return "".join(lines)
@@ -0,0 +1,306 @@
+"""
+Command-line interface.
+
+    $ gd-tools annotate --jobs 4 in.conllu out.conllu
+    $ gd-tools normalise in.txt out.txt
+    $ gd-tools snapshot
+    $ gd-tools lexicon forms.tsv forms.lex
+    $ gd-tools annotate --lexicon forms.lex in.conllu out.conllu
+    $ gd-tools annotate --cache treebank.cache in.conllu out.conllu
+    $ gd-tools serve --socket /tmp/gd_tools.sock
+    $ gd-tools grammar grammar/
+    $ gd-tools supertags in.conllu supertags.tsv
+    $ gd-tools impact corpus.conllu corpus.impact
+    $ gd-tools impact-diff corpus.impact --update
+"""
+import argparse
+import asyncio
+from collections import deque
+import itertools
+import multiprocessing
+import sys
+import time
+from typing import Iterable, Iterator, Optional
+from gd_tools.cache import AnnotationCache
+from gd_tools.core import GOC, Lemmatizer_xpos
+from gd_tools.lexicon import MmapLexicon
+from gd_tools.registry import SNAPSHOT_ENV, Registry
+from gd_tools.conllu import FORM, XPOS, Annotator, Splitter, is_word, read_sentences, write_sentence
+
+_annotator = None
+
+def _build_annotator(lexicon: Optional[str] = None, split: bool = False,
+                     cache: Optional[str] = None, fingerprint: Optional[str] = None) -> Annotator:
+    """
+    An annotator mapping the lexicon file if given, splitting fused tokens if split is true
+    and opening the sentence cache if given. Whoever builds it closes the cache.
+    """
+    lemmatizer = None if lexicon is None else Lemmatizer_xpos(lexicon=MmapLexicon(lexicon))
+    return Annotator(lemmatizer, splitter=Splitter() if split else None,
+                     cache=None if cache is None else AnnotationCache(cache, fingerprint))
+
+def _init_worker(lexicon: Optional[str] = None, split: bool = False,
+                 cache: Optional[str] = None, fingerprint: Optional[str] = None):
+    """Builds the annotator once per worker process; it lasts as long as the process."""
+    global _annotator
+    _annotator = _build_annotator(lexicon, split, cache, fingerprint)
+
+def _annotate_chunk(chunk: list, annotator: Optional[Annotator] = None) -> tuple:
+    """
+    Returns the annotated text of a list of sentences and the number of words in it,
+    using annotator or else the worker's own.
+    """
+    if annotator is None:
+        if _annotator is None:
+            _init_worker()
+        annotator = _annotator
+    words = annotator.annotate_sentences(chunk)
+    return "".join(write_sentence(sentence) for sentence in chunk), words
+
+def chunks(lines: Iterable[str], size: int) -> Iterator[list]:
+    """Splits input into lists of size sentences."""
+    sentences = read_sentences(lines)
+    while True:
+        chunk = list(itertools.islice(sentences, size))
+        if not chunk:
+            return
+        yield chunk
+
+def annotate(infile, outfile, jobs: int = 1, chunk_size: int = 256,
+             lexicon: Optional[str] = None, split: bool = False,
+             cache: Optional[str] = None) -> int:
+    """
+    Annotates infile into outfile and returns the number of words.
+    lexicon is the path of a file written by MmapLexicon.build; if split is true,
+    fused tokens are split into multiword ranges first. cache is the path of an
+    AnnotationCache, which is emptied first if the resources, code or options changed.
+
+    With more than one job, chunks of sentences go to a process pool. At most a few chunks
+    per worker are in flight and results are written in input order, so the output is
+    identical to a single-process run and memory stays bounded.
+    """
+    words = 0
+    fingerprint = None
+    if cache is not None:
+        fingerprint = AnnotationCache.fingerprint_of(lexicon=lexicon, split=split)
+        AnnotationCache(cache, fingerprint).close()
+    if jobs <= 1:
+        annotator = _build_annotator(lexicon, split, cache, fingerprint)
+        try:
+            for chunk in chunks(infile, chunk_size):
+                text, count = _annotate_chunk(chunk, annotator)
+                outfile.write(text)
+                words += count
+        finally:
+            if annotator.cache is not None:
+                annotator.cache.close()
+        return words
+    with multiprocessing.Pool(jobs, initializer=_init_worker,
+                              initargs=(lexicon, split, cache, fingerprint)) as pool:
+        pending = deque()
+        for chunk in chunks(infile, chunk_size):
+            pending.append(pool.apply_async(_annotate_chunk, (chunk,)))
+            if len(pending) >= jobs * 4:
+                text, count = pending.popleft().get()
+                outfile.write(text)
+                words += count
+        while pending:
+            text, count = pending.popleft().get()
+            outfile.write(text)
+            words += count
+    return words
+
+def annotate_command(args) -> int:
+    start = time.perf_counter()
+    with open(args.input, encoding="utf-8") as infile, \
+         open(args.output, "w", encoding="utf-8") as outfile:
+        words = annotate(infile, outfile, args.jobs, args.chunk_size, args.lexicon,
+                         args.split, args.cache)
+    elapsed = time.perf_counter() - start
+    print(f"{words} tokens in {elapsed:.2f}s ({words / elapsed if elapsed else 0:.0f} tokens/s)",
+          file=sys.stderr)
+    return 0
+
+def normalise_command(args) -> int:
+    GOC().normalise_file(args.input, args.output)
+    return 0
+
+def snapshot_command(args) -> int:
+    path = Registry(snapshot=args.output).write_snapshot()
+    parsed = min(Registry.cold_start(snapshot=False) for _ in range(5))
+    snapshot = min(Registry.cold_start(snapshot=path) for _ in range(5))
+    print(f"wrote {path}", file=sys.stderr)
+    print(f"cold start: {parsed:.2f}ms parsing, {snapshot:.2f}ms from snapshot", file=sys.stderr)
+    if args.output:
+        print(f"set {SNAPSHOT_ENV}={path} for the other commands to use it", file=sys.stderr)
+    return 0
+
+def lexicon_entries(infile) -> Iterator[tuple]:
+    """
+    (form, XPOS, lemma) from form TAB XPOS TAB lemma lines, skipping blank ones.
+    Raises ValueError naming the line if one does not have three fields.
+    """
+    for number, line in enumerate(infile, 1):
+        if not line.strip():
+            continue
+        row = line.rstrip("\r\n").split("\t")
+        if len(row) != 3:
+            raise ValueError(f"line {number}: expected form, XPOS and lemma separated by tabs, "
+                             f"got {len(row)} field{'s' if len(row) != 1 else ''}")
+        yield tuple(row)
+
+def lexicon_command(args) -> int:
+    try:
+        with open(args.input, encoding="utf-8") as infile:
+            count = MmapLexicon.build(lexicon_entries(infile), args.output)
+    except ValueError as error:
+        print(f"{args.input}: {error}", file=sys.stderr)
+        return 1
+    print(f"wrote {count} entries to {args.output}", file=sys.stderr)
+    return 0
+
+def paradigms_command(args) -> int:
+    from gd_tools.paradigm import ParadigmGenerator
+    generator = ParadigmGenerator()
+    count = 0
+    with open(args.output, "w", encoding="utf-8") as outfile:
+        for surface, xpos, lemma in generator.entries():
+            outfile.write(f"{surface}\t{xpos}\t{lemma}\n")
+            count += 1
+    print(f"wrote {count} forms, rejected {generator.rejected}", file=sys.stderr)
+    return 0
+
+def impact_command(args) -> int:
+    from gd_tools.impact import ImpactIndex
+    index = ImpactIndex()
+    with open(args.input, encoding="utf-8") as infile:
+        words = index.add(read_sentences(infile))
+    index.save(args.output)
+    print(f"indexed {words} tokens, {len(index.lemmas)} types", file=sys.stderr)
+    return 0
+
+def impact_diff(index, resources: Registry, outfile) -> int:
+    """
+    Writes sentence, ID, FORM, XPOS, old and new LEMMA for each word whose lemma changes
+    under resources, and returns how many there are.
+    """
+    changes = index.update(resources)
+    for sent_id, word_id, form, xpos, old, new in changes:
+        outfile.write(f"{sent_id}\t{word_id}\t{form}\t{xpos or '_'}\t{old}\t{new}\n")
+    return len(changes)
+
+def impact_diff_command(args) -> int:
+    from gd_tools.impact import ImpactIndex
+    index = ImpactIndex.load(args.index)
+    resources = Registry(args.resources)
+    lookups = len(index.changed(resources))
+    types = len(index.affected(resources))
+    changes = impact_diff(index, resources, sys.stdout)
+    print(f"{lookups} lookups changed, {types} types lemmatized again, {changes} tokens changed",
+          file=sys.stderr)
+    if args.update:
+        index.save(args.index)
+    return 0
+
+def supertags(infile, outfile, retagger) -> int:
+    """
+    Writes FORM, XPOS and the space-separated supertag candidates of each word of a CoNLL-U
+    file, with a blank line after each sentence. Returns the number of words.
+    """
+    words = 0
+    for sentence in read_sentences(infile):
+        lines = [line for line in sentence if is_word(line)]
+        xposes = [None if line[XPOS] == "_" else line[XPOS] for line in lines]
+        for line, tags in zip(lines, retagger.retag_sentence([line[FORM] for line in lines],
+                                                             xposes)):
+            outfile.write(f"{line[FORM]}\t{line[XPOS]}\t{' '.join(tags or ['_'])}\n")
+        outfile.write("\n")
+        words += len(lines)
+    return words
+
+def supertags_command(args) -> int:
+    from gd_tools.ccg import CCGRetagger
+    with open(args.input, encoding="utf-8") as infile, \
+         open(args.output, "w", encoding="utf-8") as outfile:
+        words = supertags(infile, outfile, CCGRetagger())
+    print(f"{words} tokens", file=sys.stderr)
+    return 0
+
+def grammar_command(args) -> int:
+    from gd_tools.ccg import GrammarExporter
+    for name, status in GrammarExporter().export(args.output).items():
+        print(f"{name}: {status}", file=sys.stderr)
+    return 0
+
+def serve_command(args) -> int:
+    from gd_tools.server import serve
+    print(f"serving on {args.socket or f'{args.host}:{args.port}'}", file=sys.stderr)
+    try:
+        asyncio.run(serve(args.socket, args.host, args.port, max_batch=args.max_batch,
+                          max_delay=args.max_delay / 1000))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def parser() -> argparse.ArgumentParser:
+    result = argparse.ArgumentParser(prog="gd-tools",
+                                     description="Natural language processing tools for Scottish Gaelic")
+    commands = result.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("annotate", help="fill in LEMMA and FEATS in a CoNLL-U file")
+    command.add_argument("--jobs", "-j", type=int, default=1, help="number of worker processes")
+    command.add_argument("--chunk-size", type=int, default=256, help="sentences per work unit")
+    command.add_argument("--lexicon", help="full-form lexicon built with gd-tools lexicon")
+    command.add_argument("--split", action="store_true",
+                         help="split fused tokens listed in splits.csv into multiword ranges")
+    command.add_argument("--cache", help="sentence cache file; only changed sentences are annotated")
+    command.add_argument("input")
+    command.add_argument("output")
+    command.set_defaults(function=annotate_command)
+    command = commands.add_parser("normalise", help="normalise running pre-GOC text")
+    command.add_argument("input")
+    command.add_argument("output")
+    command.set_defaults(function=normalise_command)
+    command = commands.add_parser("snapshot", help="write a snapshot of the parsed resources")
+    command.add_argument("--output", help=f"defaults to snapshot.marshal in the resource folder; "
+                                          f"set {SNAPSHOT_ENV} to load it from elsewhere")
+    command.set_defaults(function=snapshot_command)
+    command = commands.add_parser("lexicon", help="build a full-form lexicon from form, XPOS, lemma TSV")
+    command.add_argument("input")
+    command.add_argument("output")
+    command.set_defaults(function=lexicon_command)
+    command = commands.add_parser("paradigms", help="write checked form, XPOS, lemma TSV for gd-tools lexicon")
+    command.add_argument("output")
+    command.set_defaults(function=paradigms_command)
+    command = commands.add_parser("serve", help="answer JSON-lines annotation requests")
+    command.add_argument("--socket", help="Unix socket path; otherwise listens on TCP")
+    command.add_argument("--host", default="127.0.0.1")
+    command.add_argument("--port", type=int, default=8765)
+    command.add_argument("--max-batch", type=int, default=1024, help="tokens per micro-batch")
+    command.add_argument("--max-delay", type=float, default=2.0,
+                         help="milliseconds a request may wait for others to join its batch")
+    command.set_defaults(function=serve_command)
+    command = commands.add_parser("grammar", help="export an OpenCCG grammar, rebuilding only what changed")
+    command.add_argument("output", help="folder for the .ccg fragments and grammar.ccg")
+    command.set_defaults(function=grammar_command)
+    command = commands.add_parser("impact", help="index which lexicon entries each corpus word depends on")
+    command.add_argument("input")
+    command.add_argument("output")
+    command.set_defaults(function=impact_command)
+    command = commands.add_parser("impact-diff",
+                                  help="relemmatize the words affected by resource edits and list the changes")
+    command.add_argument("index")
+    command.add_argument("--resources", help="folder of edited resources; defaults to the package's own")
+    command.add_argument("--update", action="store_true", help="write the updated index back")
+    command.set_defaults(function=impact_diff_command)
+    command = commands.add_parser("supertags", help="write CCG supertag candidates for each word")
+    command.add_argument("input")
+    command.add_argument("output")
+    command.set_defaults(function=supertags_command)
+    return result
+
+def main(argv: Optional[list] = None) -> int:
+    args = parser().parse_args(argv)
+    return args.function(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
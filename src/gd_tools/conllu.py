@@ -0,0 +1,213 @@
+"""
+Streaming CoNLL-U reading, annotation and writing.
+
+Files are processed a sentence at a time, so memory use does not grow with the size of the corpus.
+"""
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+from gd_tools.batch import BatchAnnotator
+from gd_tools.core import Lemmatizer_xpos
+from gd_tools.registry import Registry
+from gd_tools.ud import Features
+
+if TYPE_CHECKING:
+    from gd_tools.cache import AnnotationCache
+
+ID, FORM, LEMMA, UPOS, XPOS, FEATS, HEAD, DEPREL, DEPS, MISC = range(10)
+
+def read_sentences(lines: Iterable[str]) -> Iterator[list]:
+    """
+    Groups lines into sentences.
+
+    Comments are kept as strings and token lines are split into lists of ten fields.
+    """
+    sentence = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line == "":
+            if sentence:
+                yield sentence
+                sentence = []
+        elif line.startswith("#"):
+            sentence.append(line)
+        else:
+            sentence.append(line.split("\t"))
+    if sentence:
+        yield sentence
+
+def write_sentence(sentence: list) -> str:
+    """Inverse of read_sentences for one sentence, including the blank line after it."""
+    return "".join((line if isinstance(line, str) else "\t".join(line)) + "\n"
+                   for line in sentence) + "\n"
+
+def is_word(line) -> bool:
+    """True for syntactic words, false for comments, multiword ranges and empty nodes."""
+    return not isinstance(line, str) and line[ID].isdigit()
+
+def parse_feats(feats: str) -> dict:
+    """Case=Nom|Gender=Masc becomes {"Case": ["Nom"], "Gender": ["Masc"]}."""
+    if feats == "_":
+        return {}
+    return {key: [value] for key, value in (pair.split("=", 1) for pair in feats.split("|"))}
+
+def format_feats(feats: dict) -> str:
+    """Inverse of parse_feats, sorted case-insensitively as the UD validator expects."""
+    if not feats:
+        return "_"
+    return "|".join(f"{key}={','.join(feats[key])}" for key in sorted(feats, key=str.lower))
+
+class Splitter:
+    """
+    Splits fused tokens such as _bhon_ and _sa_ into multiword ranges, as listed in splits.csv.
+
+    IDs, HEADs and DEPS are renumbered to match. The range line keeps the fused FORM and
+    MISC. The first part takes over the fused token's HEAD, DEPREL and DEPS; the second part
+    gets the same HEAD with a DEPREL chosen by its UPOS, or "_" if there is no HEAD, and the
+    matching enhanced dependency if the fused token had DEPS.
+    Tokens already inside a multiword range are left alone.
+    """
+    deprels = {"ADP": "case", "DET": "det", "PART": "mark"}
+
+    def __init__(self, resources: Registry = None):
+        self.resources = resources or Registry.shared()
+        self.splits = self.resources.splits()
+
+    def split(self, sentences: Iterable[list]) -> Iterator[list]:
+        """Splits a stream of sentences from read_sentences."""
+        for sentence in sentences:
+            yield self.split_sentence(sentence)
+
+    def split_sentence(self, sentence: list) -> list:
+        """Returns the split sentence, or the same list if nothing needed splitting."""
+        covered = set()
+        for line in sentence:
+            if not isinstance(line, str) and "-" in line[ID]:
+                start, end = line[ID].split("-")
+                covered.update(str(i) for i in range(int(start), int(end) + 1))
+        first, last, parts = {}, {}, {}
+        offset = 0
+        for line in sentence:
+            if is_word(line):
+                first[line[ID]] = str(int(line[ID]) + offset)
+                if line[ID] not in covered:
+                    split = self.splits.get((line[FORM].lower(), line[XPOS]))
+                    if split is not None:
+                        parts[line[ID]] = split
+                        offset += 1
+                last[line[ID]] = str(int(line[ID]) + offset)
+        if not parts:
+            return sentence
+        def head(value):
+            return first.get(value, value)
+        def deps(value):
+            if value == "_":
+                return value
+            return "|".join(f"{head(dep.split(':', 1)[0])}:{dep.split(':', 1)[1]}"
+                            for dep in value.split("|"))
+        result = []
+        for line in sentence:
+            if isinstance(line, str):
+                result.append(line)
+            elif "-" in line[ID]:
+                start, end = line[ID].split("-")
+                result.append([f"{first[start]}-{last[end]}"] + line[FORM:])
+            elif "." in line[ID]:
+                word, empty = line[ID].split(".")
+                result.append([f"{last.get(word, word)}.{empty}"] + line[FORM:DEPS]
+                              + [deps(line[DEPS]), line[MISC]])
+            elif line[ID] in parts:
+                (form1, upos1, xpos1), (form2, upos2, xpos2) = parts[line[ID]]
+                if line[FORM] != line[FORM].lower():
+                    form1 = form1[0].upper() + form1[1:]
+                new_id = int(first[line[ID]])
+                new_head = head(line[HEAD])
+                new_deps = deps(line[DEPS])
+                deprel2 = self.deprels.get(upos2, "dep")
+                deps2 = "_"
+                if new_deps != "_":
+                    deps_head = new_head if new_head != "_" else new_deps.split(":", 1)[0]
+                    deps2 = f"{deps_head}:{deprel2}"
+                result.append([f"{new_id}-{new_id + 1}", line[FORM]] + ["_"] * 7 + [line[MISC]])
+                result.append([str(new_id), form1, "_", upos1, xpos1, "_", new_head,
+                               line[DEPREL], new_deps, "_"])
+                result.append([str(new_id + 1), form2, "_", upos2, xpos2, "_", new_head,
+                               "_" if new_head == "_" else deprel2, deps2, "_"])
+            else:
+                result.append([first[line[ID]], line[FORM], line[LEMMA], line[UPOS], line[XPOS],
+                               line[FEATS], head(line[HEAD]), line[DEPREL], deps(line[DEPS]),
+                               line[MISC]])
+        return result
+
+class Annotator:
+    """
+    Fills in LEMMA and FEATS from FORM and XPOS.
+
+    Comments, multiword ranges and empty nodes pass through unchanged.
+    If a Splitter is given, fused tokens are split first and the parts are annotated.
+    If an AnnotationCache is given, sentences found in it are filled in from there and
+    the rest are added to it once annotated.
+    """
+    def __init__(self, lemmatizer: Optional[Lemmatizer_xpos] = None,
+                 featuriser: Optional[Features] = None,
+                 splitter: Optional[Splitter] = None,
+                 cache: Optional["AnnotationCache"] = None):
+        self.lemmatizer = lemmatizer or Lemmatizer_xpos()
+        self.featuriser = featuriser or Features()
+        self.splitter = splitter
+        self.cache = cache
+        self.batch = BatchAnnotator(self.lemmatizer, self.featuriser)
+
+    def annotate_sentence(self, sentence: list) -> list:
+        """Annotates sentence and returns it, in place unless it had to be split."""
+        sentences = [sentence]
+        self.annotate_sentences(sentences)
+        return sentences[0]
+
+    def annotate_sentences(self, sentences: list) -> int:
+        """
+        Annotates a list of sentences in place with one BatchAnnotator call, so that each
+        distinct word is lemmatized once. Sentences that are split are replaced in the list.
+        With a cache, only the sentences missing from it are annotated.
+        Returns the number of words.
+        """
+        if self.splitter is not None:
+            sentences[:] = [self.splitter.split_sentence(sentence) for sentence in sentences]
+        if self.cache is not None:
+            misses = self.cache.fill(sentences)
+            self.annotate_words([words for _, words in misses])
+            self.cache.store(misses)
+            return sum(1 for sentence in sentences for line in sentence if is_word(line))
+        return self.annotate_words([[line for line in sentence if is_word(line)]
+                                    for sentence in sentences])
+
+    def annotate_words(self, sentences: list) -> int:
+        """Annotates the word lines of each sentence in place and returns how many there are."""
+        words, starts = [], []
+        for sentence in sentences:
+            starts.append(len(words))
+            words.extend(sentence)
+        xposes = [None if line[XPOS] == "_" else line[XPOS] for line in words]
+        result = self.batch.annotate(
+            [line[FORM] for line in words], xposes,
+            feats=[parse_feats(line[FEATS]) for line in words],
+            prev_xposes=BatchAnnotator.previous(xposes, starts))
+        for line, xpos, lemma, feats in zip(words, xposes, result["lemma"], result["feats"]):
+            line[LEMMA] = lemma
+            if xpos is not None:
+                line[FEATS] = format_feats(feats)
+        return len(words)
+
+    def annotate(self, lines: Iterable[str]) -> Iterator[str]:
+        """Yields the annotated text sentence by sentence."""
+        for sentence in read_sentences(lines):
+            yield write_sentence(self.annotate_sentence(sentence))
+
+    def annotate_file(self, in_path, out_path) -> int:
+        """Annotates one file into another and returns the number of words."""
+        words = 0
+        with open(in_path, encoding="utf-8") as infile, \
+             open(out_path, "w", encoding="utf-8") as outfile:
+            for sentence in read_sentences(infile):
+                sentences = [sentence]
+                words += self.annotate_sentences(sentences)
+                outfile.write(write_sentence(sentences[0]))
+        return words
@@ -1,59 +1,248 @@
-import os
-import csv
+import functools
+import inspect
 import re
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Iterable, Iterator, Optional
+from gd_tools.lexicon import Lexicon
+from gd_tools.registry import Registry
 
 class Core:
     """
     Static methods shared between classes.
     """
     @staticmethod
-    def replace_ending(replacements: dict, surface) -> str:
+    def replace_ending(replacements, surface) -> str:
+        """
+        Replaces the first ending in replacements which surface ends with.
+
+        replacements is either a dict or, on hot paths, a precompiled SuffixRules.
+        """
+        if isinstance(replacements, SuffixRules):
+            return replacements.apply(surface)
         for key in replacements:
             if surface.endswith(key):
                 return re.sub(key + "$", replacements[key], surface)
         return surface
 
+class SuffixRules:
+    """
+    Table of ending replacements compiled into a trie of reversed endings.
+
+    A lookup walks back from the end of the word, so it costs time proportional
+    to the length of the word rather than the size of the table.
+    Where several endings match, the one listed first wins, as in Core.replace_ending.
+    """
+    def __init__(self, replacements: dict):
+        self.replacements = dict(replacements)
+        self.trie = {}
+        for rank, ending in enumerate(self.replacements):
+            node = self.trie
+            for char in reversed(ending):
+                node = node.setdefault(char, {})
+            node[None] = (rank, len(ending), self.replacements[ending])
+
+    def apply(self, surface: str) -> str:
+        """Replaces the ending of surface, or returns it unchanged if no rule matches."""
+        node = self.trie
+        best = node.get(None)
+        for char in reversed(surface):
+            node = node.get(char)
+            if node is None:
+                break
+            rule = node.get(None)
+            if rule is not None and (best is None or rule[0] < best[0]):
+                best = rule
+        if best is None:
+            return surface
+        return surface[:len(surface) - best[1]] + best[2]
+
+class LRUCache:
+    """
+    Bounded memo table with least-recently-used eviction.
+
+    Keeps hit, miss and eviction counters which can be read with info().
+    Safe to share between threads: the table is locked while it is read or changed, but not
+    while the wrapped function runs, so two threads missing on one key may both compute it.
+    """
+    def __init__(self, maxsize: int):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def wrap(self, function):
+        """
+        Returns a version of function memoized on its arguments.
+
+        Keyword arguments are bound to their positions first, so f(a, b) and f(a, y=b)
+        share an entry.
+        """
+        data = self.data
+        lock = self.lock
+        signature = inspect.signature(function)
+        def cached(*args, **kwargs):
+            if kwargs:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                args = tuple(bound.arguments.values())
+            with lock:
+                if args in data:
+                    data.move_to_end(args)
+                    self.hits += 1
+                    return data[args]
+                self.misses += 1
+            result = function(*args)
+            with lock:
+                data[args] = result
+                if len(data) > self.maxsize:
+                    data.popitem(last=False)
+                    self.evictions += 1
+            return result
+        return functools.wraps(function)(cached)
+
+    def clear(self):
+        """Empties the table and resets the counters."""
+        with self.lock:
+            self.data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self) -> dict:
+        """Snapshot of the counters."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "size": len(self.data), "maxsize": self.maxsize}
+
+class Instrumentation:
+    """
+    Counts which branch of the lemmatizer each token took and how long each XPOS family takes.
+    The counters are locked, so one Instrumentation can be shared between threads.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.families = {}
+
+    def count(self, branch: str):
+        """Records one visit to branch."""
+        with self.lock:
+            self.counts[branch] = self.counts.get(branch, 0) + 1
+
+    def timed(self, family: str, handler):
+        """Wraps handler so that its calls and their time are added to family."""
+        def timed_handler(surface):
+            start = time.perf_counter()
+            result = handler(surface)
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                tokens, seconds = self.families.get(family, (0, 0.0))
+                self.families[family] = (tokens + 1, seconds + elapsed)
+            return result
+        return timed_handler
+
+    def reset(self):
+        """Sets everything back to zero."""
+        with self.lock:
+            self.counts = {}
+            self.families = {}
+
+    def snapshot(self) -> dict:
+        """Copy of the counters: branch counts, and tokens and seconds per XPOS family."""
+        with self.lock:
+            return {"branches": dict(self.counts),
+                    "families": {family: {"tokens": tokens, "seconds": seconds}
+                                 for family, (tokens, seconds) in self.families.items()}}
+
 class GOC:
     """
     Normaliser for pre-GOC texts.
+
+    Works on single words, or streams over running text with normalise_text.
+    The word tables are built once, when the normaliser is created, so one GOC can be
+    shared between threads.
     """
+    schwa_rules = SuffixRules({"uidh": "aidh", "uinn": "ainn", "uis": "ais", "um": "am", "us": "as"})
+    acutes = str.maketrans({"é": "è", "ó": "ò"})
+    spacing = re.compile("'([ei])")
+    word = re.compile(r"[\w'-]+")
+    a_accents = frozenset(["fhearr", "paipear", "paipeir", "ard", "thainig"])
+    u_accents = frozenset(["duthcha", "duthaich"])
+
+    def __init__(self, cache_size: int = 65536):
+        self.specials = {"aghart": "adhart", "maith": "math", "so": "seo",
+                         "tigh": "taigh",
+                         "timchioll": "timcheall"}
+        self.shpecials = {}
+        for key in self.specials:
+            self.shpecials[Morphology.lenite(key)] = Morphology.lenite(self.specials[key])
+        self.cache = LRUCache(cache_size)
+        self.normalise_word = self.cache.wrap(self.normalise_word)
+
     def normalise(self, surface: str) -> str:
-        result = self.standardise_schwa(re.sub(r"ó", "ò", re.sub(r"é", "è", surface)))
-        result = re.sub(r"^str", "sr", result)
+        result = self.standardise_schwa(surface.translate(self.acutes))
+        if result.startswith("str"):
+            result = "s" + result[2:]
         return self.normalise_specials(result)
 
     def normalise_spacing(self, surface: str) -> str:
         if surface == "d'a":
             return "da"
-        return re.sub("'([ei])", r"' \1", surface)
+        return self.spacing.sub(r"' \1", surface)
 
     def normalise_specials(self, surface: str) -> str:
-        specials = {"aghart": "adhart", "maith": "math", "so": "seo",
-                    "tigh": "taigh",
-                    "timchioll": "timcheall"}
-        shpecials = {}
-        for key in specials:
-            shpecials[Morphology.lenite(key)] = Morphology.lenite(specials[key])
-        if surface in specials:
-            return specials[surface]
-        if surface in shpecials:
-            return shpecials[surface]
+        if surface in self.specials:
+            return self.specials[surface]
+        if surface in self.shpecials:
+            return self.shpecials[surface]
         return surface
 
+    def normalise_word(self, surface: str) -> str:
+        """
+        Fixes the spacing, then normalises and restores accents in each resulting word.
+        Memoized, since running text repeats the same words over and over.
+        """
+        spaced = self.normalise_spacing(surface)
+        if spaced == surface:
+            return self.restore_accents(self.normalise(surface))
+        return " ".join(self.restore_accents(self.normalise(part)) for part in spaced.split(" "))
+
+    def normalise_text(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        Streams over running pre-GOC text, a line at a time, normalising every word in one pass.
+        Curly apostrophes are straightened first. Everything between words is left alone.
+        """
+        for line in lines:
+            yield self.word.sub(lambda match: self.normalise_word(match.group()),
+                                line.translate(Lemmatizer_xpos.quotes))
+
+    def normalise_file(self, in_path, out_path):
+        """Normalises one text file into another."""
+        with open(in_path, encoding="utf-8") as infile, \
+             open(out_path, "w", encoding="utf-8") as outfile:
+            outfile.writelines(self.normalise_text(infile))
+
     def restore_accents(self, surface: str) -> str:
-        if surface.lower() in ["fhearr", "paipear", "paipeir", "ard", "thainig"]:
-            return re.sub("a", "à", surface, count = 1)
-        if surface.lower() in ["duthcha", "duthaich"]:
-            return re.sub("u", "ù", surface, count = 1)
+        lower = surface.lower()
+        if lower in self.a_accents:
+            return surface.replace("a", "à", 1)
+        if lower in self.u_accents:
+            return surface.replace("u", "ù", 1)
         if surface in ["Eireann", "Eirinn"]:
-            return re.sub("E", "È", surface, count = 1)
+            return surface.replace("E", "È", 1)
         return surface
 
     def standardise_schwa(self, surface: str) -> str:
         if surface in ["Agus", "agus"]:
             return surface
-        replacements = { "uidh": "aidh", "uinn": "ainn", "uis": "ais", "um": "am", "us": "as" }
-        return Core.replace_ending(replacements, surface)
+        return Core.replace_ending(self.schwa_rules, surface)
 
 class Morphology:
     """
@@ -131,15 +320,18 @@ class Morphology:
 class Lemmatizer:
     """
     Lemmatizer for Scottish Gaelic which only uses surface information.
+
+    If cache_size is given, lemmatize_preposition is memoized in an LRUCache of that size.
+    Tables come from the shared Registry unless resources is given.
+    A full-form Lexicon, if given, is consulted before any rules.
+    Nothing changes after construction except the caches, so one instance can be shared
+    between threads.
     """
-    def __init__(self):
-        folder = os.path.dirname(__file__)
-        lemmata_path = os.path.join(folder, 'resources', 'lemmata.csv')
-        self.lemmata = {}
-        with open(lemmata_path) as file:
-            reader = csv.reader(filter(lambda row: row[0] != '#', file))
-            for row in reader:
-                self.lemmata[row[0]] = row[1]
+    def __init__(self, cache_size: Optional[int] = None, resources: Registry = None,
+                 lexicon: Optional[Lexicon] = None):
+        self.resources = resources or Registry.shared()
+        self.lexicon = lexicon
+        self.lemmata = self.resources.lemmata()
         pronouns = {
             "mi": ["mise"], "thu": ["tu", "tusa", "thusa"],
             "e": ["esan"], "i": ["ise"],
@@ -150,18 +342,34 @@ class Lemmatizer:
         for key in pronouns:
             for value in pronouns[key]:
                 self.pronouns[value] = key
-        self.prepositions = {}
-        prep_path = os.path.join(folder, 'resources', 'prepositions.csv')
-        with open(prep_path) as file:
-            reader = csv.reader(file)
-            for row in reader:
-                self.prepositions[row[0]] = row[1]
+        self.prepositions = self.resources.prepositions()
+        self.preposition_matcher, self.preposition_lemmata = self.resources.preposition_matcher()
+        self.caches = {}
+        if cache_size is not None:
+            self.caches["lemmatize_preposition"] = LRUCache(cache_size)
+            self.lemmatize_preposition = \
+                self.caches["lemmatize_preposition"].wrap(self.lemmatize_preposition)
+
+    def cache_info(self) -> dict:
+        """
+        Hit, miss and eviction counters for each memoized method.
+        Empty if caching is switched off.
+        """
+        return {name: cache.info() for name, cache in self.caches.items()}
+
+    def cache_clear(self):
+        """Empties every cache and resets the counters."""
+        for cache in self.caches.values():
+            cache.clear()
 
     def lemmatize_comparative(self, surface: str) -> str:
         """
         Delenites and slenderises.
         Irregular ones (_fhasa_, _fhuaire_, etc.) are in lemmata.csv.
         """
+        lemma = self.lookup(surface)
+        if lemma is not None:
+            return lemma
         if surface in self.lemmata:
             return self.lemmata[surface]
         surface = Morphology.delenite(surface)
@@ -173,6 +381,9 @@ class Lemmatizer:
         """
         Lemmatizes the conjunction in 'surface'
         """
+        lemma = self.lookup(surface)
+        if lemma is not None:
+            return lemma
         if surface == "a's":
             return "agus"
         if re.match("'i?s", surface):
@@ -181,19 +392,39 @@ class Lemmatizer:
             return "an"
         return surface
 
+    def lookup(self, surface: str) -> Optional[str]:
+        """
+        Returns the lemma the external lexicon gives for 'surface', if any.
+        """
+        if self.lexicon is None:
+            return None
+        return self.lexicon.lookup(surface)
+
+    def match_preposition(self, surface: str) -> Optional[str]:
+        """
+        Lemma for the first pattern in prepositions.csv which matches the whole of surface.
+        """
+        match = self.preposition_matcher.fullmatch(surface)
+        if match:
+            return self.preposition_lemmata[int(match.lastgroup[1:])]
+        return None
+
     def lemmatize_preposition(self, surface: str) -> str:
         """
         Lemmatizes the preposition in 'surface'
         """
+        lemma = self.lookup(surface)
+        if lemma is not None:
+            return lemma
         if surface.startswith("'") and len(surface) > 1:
             surface = surface[1:]
         surface = Morphology.remove_final_apostrophe(surface.replace(' ', '_'))
         surface = re.sub('^h-', '', surface)
         if not re.match("^'?s[ae]n?$", surface):
             surface = re.sub("-?s[ae]n?$", "", surface)
-        for pattern in self.prepositions:
-            if re.match("^("+pattern+")$", surface):
-                return self.prepositions[pattern]
+        lemma = self.match_preposition(surface)
+        if lemma is not None:
+            return lemma
         if re.match("bh?eulaibh", surface):
             return "beul"
         return "bho" if surface.startswith("bh") else Morphology.delenite(surface)
@@ -202,6 +433,9 @@ class Lemmatizer:
         """
         Consider rewriting based on POS tag.
         """
+        lemma = self.lookup(surface)
+        if lemma is not None:
+            return lemma
         if surface == "sib'":
             return "sibh"
         if surface.endswith("'"):
@@ -218,41 +452,163 @@ class Lemmatizer_xpos:
 
     The POS tags are taken from ARCOSG.
     For future-proofing it would be good to support other UD fields
+
+    Caching is opt-in: if cache_size is given, lemmatize, lemmatize_noun, lemmatize_verb
+    and the inner lemmatize_preposition each get an LRUCache of that size.
+    Tables come from the shared Registry unless resources is given.
+    A full-form Lexicon, if given, is consulted with the normalised surface and the XPOS
+    before the rules.
+
+    Without a Lexicon, common nouns, verbal nouns and adjectives go through a mutation index
+    first: every lenited, capitalised or prefixed (h-, t-, n-, dh') variant of a lemmata.csv
+    or verbal_nouns.csv entry that the cascade would find in those tables, mapped straight to
+    its lemma, so known words take one dictionary probe. Each family's index is built on first
+    use and shared by every Lemmatizer_xpos on the same Registry; pass index=False to do
+    without.
+
+    lemmatize_readings gives every reading of an untagged surface and always has an LRUCache
+    of readings_cache_size surfaces.
+
+    One instance can be shared between threads, including on free-threaded builds: the tables
+    do not change after construction, the caches are LRUCaches, and handlers and indexes are
+    built under a lock the first time each is needed. Only instrument() must not be called
+    while other threads are lemmatizing.
     """
-    def __init__(self):
-        folder = os.path.dirname(__file__)
+    cached_methods = ["lemmatize", "lemmatize_noun", "lemmatize_verb"]
+
+    quotes = str.maketrans({"’": "'", "‘": "'"})
+    prefixes = re.compile("^([Hh]-|t-|n-|[Dd]h')")
+    specials = [("Q--s", "do"), ("W", "is"), ("Csw", "is"), ("Td", "an")]
+    cased = frozenset(["Nc", "Nn", "Nt", "Up", "Y"])
+    unlenited = frozenset(["bhuel", "chaoidh", "cho", "fhathast", "mhmm",
+                           "thall", "thairis", "thì"])
+
+    plural_rules = SuffixRules({
+        "dhnichean": "dhne",
+        "eachan": "e", "achan": "a", "aich": "ach",
+        "aidhean": "adh", "aichean": "ach", "ichean": "iche",
+        "eannan": "e",
+        "thchannan": "thaich",
+        "annan": "a", "thran": "thar",
+        "oill": "all", "uill": "all", "ait": "at",
+        "caorach": "caora",
+        "rìghrean": "rìgh",
+        "nntean": "nn",
+        "ean": "",
+        "rsan": "ras",
+        "an": ""
+        })
+    f_rules = SuffixRules({'eig': 'eag', 'eige': 'eag',
+                           "ire": "ir",
+                           'the': 'th', "rce": "rc"})
+    m_rules = SuffixRules({
+        'aich': 'ach',
+        'aidh': 'adh',
+        "ail": "al",
+        'ais': 'as', 'uis': 'us', "aimh": "amh"})
+    relative_rules = SuffixRules({"eas": "", "as": ""})
+    verb_endings = [(prefix, re.compile(ending)) for prefix, ending in [
+        ("Vm-1p", "e?amaid$"), ("Vm-2p", "a?ibh$"),
+        ("V-s0", "e?adh$"), ("V-p0", "e?a[rs]$"), ("V-f0", "e?ar$"),
+        ("V-h1p", "omaid$"),
+        ("V-h", "e?adh$"),
+        ("Vm-3", "e?adh$"), ("V-f", "a?(idh|s)$")
+    ]]
+    vn_rules = SuffixRules({
+        "sinn": "", "tail": "", "ail": "", "eil": "", "eal": "",
+        "aich": "", "tich": "teachd", "ich": "", "tainn": "", "tinn": "",
+        "eamh": "", "amh": "",
+        "eamhainn": "", "mhainn": "", "inn": "", "eachdainn": "ich",
+        "eachadh": "ich", "achadh": "aich", "airt": "air",
+        "gladh": "gail", "eadh": "", "-adh": "", "adh": "",
+        "e": "", "eachd": "ich", "achd": "aich"
+    })
+
+    mutation_prefixes = ("h-", "H-", "t-", "n-", "dh'", "Dh'", "dh’")
+    # XPOS family: a tag for each distinct branch of the cascade within it
+    reading_xposes = {
+        "Nc": ("Ncsmn", "Ncsmg", "Ncsfd", "Ncpmn"),
+        "Nv": ("Nv",),
+        "Nn": ("Nn-mn",),
+        "Aq": ("Aq-smn",),
+        "Apc": ("Apc",),
+        "V": ("V-s", "V-s0", "V-f", "V-f--r", "V-h", "Vm-1p", "Vm-2p"),
+        "Pp": ("Pp3sm",),
+        "Sp": ("Sp",),
+        "R": ("Rg",),
+        "Cc": ("Cc",),
+    }
+
+    def __init__(self, cache_size: Optional[int] = None, resources: Registry = None,
+                 lexicon: Optional[Lexicon] = None, index: bool = True,
+                 readings_cache_size: int = 65536):
+        self.resources = resources or Registry.shared()
+        self.lexicon = lexicon
+        self.index = index and lexicon is None
+        self.index_tables = {}
         self.possessives = {
             "Dp1s": "mo", "Dp2s": "do", "Dp3s": "a",
             "Dp1p": "ar", "Dp2p": "ur", "Dp3p": "an"
         }
-        self.lemmatizer = Lemmatizer()
-        vn_path = os.path.join(folder, 'resources', 'verbal_nouns.csv')
-        vns = {}
-        with open(vn_path) as file:
-            reader = csv.reader(file)
-            for row in reader:
-                vns[row[0]] = row[1].split(";")
-        self.vns = {}
-        for key in vns:
-            for value in vns[key]:
-                self.vns[value] = key
-        lemmata_path = os.path.join(folder, 'resources', 'lemmata.csv')
-        self.lemmata = {}
-        with open(lemmata_path) as file:
-            reader = csv.reader(filter(lambda row: row[0] != '#', file))
-            for row in reader:
-                self.lemmata[row[0]] = row[1]
+        self.lemmatizer = Lemmatizer(cache_size, self.resources)
+        self.vns = self.resources.verbal_nouns()
+        self.lemmata = self.resources.lemmata()
+        self.lock = threading.Lock()
+        self.handlers = {}
+        self.stats = None
+        self.caches = {}
+        if cache_size is not None:
+            for name in self.cached_methods:
+                self.caches[name] = LRUCache(cache_size)
+                setattr(self, name, self.caches[name].wrap(getattr(self, name)))
+        self.readings_cache = LRUCache(readings_cache_size)
+        self.lemmatize_readings = self.readings_cache.wrap(self.lemmatize_readings)
+
+    def cache_info(self) -> dict:
+        """
+        Hit, miss and eviction counters for each memoized method, including those
+        of the inner surface-only Lemmatizer. Empty if caching is switched off.
+        The cache of lemmatize_readings is readings_cache.
+        """
+        result = {name: cache.info() for name, cache in self.caches.items()}
+        result.update(self.lemmatizer.cache_info())
+        return result
+
+    def cache_clear(self):
+        """Empties every cache and resets the counters."""
+        for cache in self.caches.values():
+            cache.clear()
+        self.readings_cache.clear()
+        self.lemmatizer.cache_clear()
+
+    def instrument(self, on: bool = True) -> Optional["Instrumentation"]:
+        """
+        Switches branch counting and per-family timing on or off and returns the
+        Instrumentation, which can be read with snapshot() and reset with reset().
+
+        When off, each counting point costs one attribute test. Tokens answered from
+        the optional cache are not seen.
+        """
+        self.stats = Instrumentation() if on else None
+        self.handlers = {}
+        return self.stats
 
     def lemmatize_adjective(self, surface: str, xpos: str) -> str:
         """
         The small number of special plurals are dealt with in lemmata.csv
         """
         if xpos in ["Apc", "Aps"]:
+            if self.stats is not None:
+                self.stats.count("adjective_comparative")
             return self.lemmatizer.lemmatize_comparative(surface)
         surface = Morphology.delenite(surface)
         surface = Morphology.remove_final_apostrophe(surface)
         if surface in self.lemmata:
+            if self.stats is not None:
+                self.stats.count("adjective_lexicon")
             return self.lemmata[surface]
+        if self.stats is not None:
+            self.stats.count("adjective_rule")
         if xpos == "Av":
             return re.sub("(is)?[dt][ae]?$", "", surface)
         if surface.endswith("eirg") and re.search("[gd]$", xpos):
@@ -271,22 +627,6 @@ class Lemmatizer_xpos:
         if surface.startswith("luchd"):
             return surface.replace("luchd", "neach")
 
-        plural_replacements = {
-            "dhnichean": "dhne",
-            "eachan": "e", "achan": "a", "aich": "ach",
-            "aidhean": "adh", "aichean": "ach", "ichean": "iche",
-            "eannan": "e",
-            "thchannan": "thaich",
-            "annan": "a", "thran": "thar",
-            "oill": "all", "uill": "all", "ait": "at",
-            "caorach": "caora",
-            "rìghrean": "rìgh",
-            "nntean": "nn",
-            "ean": "",
-            "rsan": "ras",
-            "an": ""
-            }
-
         if xpos.startswith("Ncp"):
             surface = re.sub("aibh$", "", surface)
             if surface == "companaidhean":
@@ -296,19 +636,11 @@ class Lemmatizer_xpos:
             '''
             if surface == "eilean":
                 return surface
-            surface = Core.replace_ending(plural_replacements, surface)
-        f_replacements = {'eig': 'eag', 'eige': 'eag',
-                          "ire": "ir",
-                          'the': 'th', "rce": "rc"}
+            surface = Core.replace_ending(self.plural_rules, surface)
         if oblique and 'f' in xpos:
-            surface = Core.replace_ending(f_replacements, surface)
-        m_replacements = {
-            'aich': 'ach',
-            'aidh': 'adh',
-            "ail": "al",
-            'ais': 'as', 'uis': 'us', "aimh": "amh"}
+            surface = Core.replace_ending(self.f_rules, surface)
         if oblique and 'm' in xpos:
-            surface = Core.replace_ending(m_replacements, surface)
+            surface = Core.replace_ending(self.m_rules, surface)
         if re.match(".*[bcdfghlmnprst]ich$", surface):
             return re.sub("ich$", "each", surface)
         return surface
@@ -328,22 +660,31 @@ class Lemmatizer_xpos:
         surface = Morphology.delenite(surface)
         surface = Morphology.remove_final_apostrophe(surface)
         if xpos.startswith("Nn"):
+            if self.stats is not None:
+                self.stats.count("noun_proper")
             return self.lemmatize_proper_noun(surface, oblique)
         if xpos == "Nt":
+            if self.stats is not None:
+                self.stats.count("noun_place")
             if surface in self.lemmata:
                 return self.lemmata[surface]
             else:
                 return surface
         if surface in self.lemmata:
+            if self.stats is not None:
+                self.stats.count("noun_lexicon")
             return self.lemmata[surface]
         surface = surface.lower()
         if xpos.endswith("e") or xpos.endswith("e*"):
             surface = re.sub("-?san?$", "", surface)
-            print(surface)
         if surface in self.lemmata:
+            if self.stats is not None:
+                self.stats.count("noun_lexicon")
             return self.lemmata[surface]            
         if xpos == "Nv":
             return self.lemmatize_vn(surface)
+        if self.stats is not None:
+            self.stats.count("noun_rule")
         return self.lemmatize_common_noun(surface, xpos, oblique)
 
     def lemmatize_number(self, surface: str) -> str:
@@ -398,22 +739,22 @@ class Lemmatizer_xpos:
         if surface == "nì":
             return "dèan"
         if surface in self.lemmata:
+            if self.stats is not None:
+                self.stats.count("verb_lexicon")
             return self.lemmata[surface]
-        replacements = [
-            ("Vm-1p", "e?amaid$"), ("Vm-2p", "a?ibh$"),
-            ("V-s0", "e?adh$"), ("V-p0", "e?a[rs]$"), ("V-f0", "e?ar$"),
-            ("V-h1p", "omaid$"),
-            ("V-h", "e?adh$"),
-            ("Vm-3", "e?adh$"), ("V-f", "a?(idh|s)$")
-        ]
         surface = Morphology.delenite(surface)
-        relative_replacements = { "eas": "", "as": "" }
         if xpos.endswith("r"): # relative form
-            return Core.replace_ending(relative_replacements, surface)
+            if self.stats is not None:
+                self.stats.count("verb_relative")
+            return Core.replace_ending(self.relative_rules, surface)
         else:
-            for replacement in replacements:
-                if xpos.startswith(replacement[0]):
-                    return re.sub(replacement[1], "", surface)
+            for prefix, ending in self.verb_endings:
+                if xpos.startswith(prefix):
+                    if self.stats is not None:
+                        self.stats.count("verb_ending")
+                    return ending.sub("", surface)
+        if self.stats is not None:
+            self.stats.count("verb_unchanged")
         return surface
 
     def lemmatize_vn(self, surface: str) -> str:
@@ -421,68 +762,250 @@ class Lemmatizer_xpos:
         Lemmatizes surface of a verbal noun.
         """
         if surface in self.vns:
+            if self.stats is not None:
+                self.stats.count("vn_lexicon")
             return self.vns[surface]
-        vn_replacements = {
-            "sinn": "", "tail": "", "ail": "", "eil": "", "eal": "",
-            "aich": "", "tich": "teachd", "ich": "", "tainn": "", "tinn": "",
-            "eamh": "", "amh": "",
-            "eamhainn": "", "mhainn": "", "inn": "", "eachdainn": "ich",
-            "eachadh": "ich", "achadh": "aich", "airt": "air",
-            "gladh": "gail", "eadh": "", "-adh": "", "adh": "",
-            "e": "", "eachd": "ich", "achd": "aich"
-        }
-        return Core.replace_ending(vn_replacements, surface)
+        if self.stats is not None:
+            self.stats.count("vn_rule")
+        return Core.replace_ending(self.vn_rules, surface)
 
     def lemmatize(self, surface: str, xpos: str) -> str:
         """
         Lemmatize surface with help from the xpos.
         """
-        surface = surface.replace('\xe2\x80\x99', "'").replace('\xe2\x80\x98', "'")
-        surface = re.sub("[’‘]", "'", surface)
-        surface = re.sub("^([Hh]-|t-|n-|[Dd]h')", "", surface)
-        specials = [("Q--s", "do"), ("W", "is"), ("Csw", "is"), ("Td", "an")]
+        if self.index and xpos is not None:
+            table = self.index_tables.get(xpos)
+            if table is None:
+                table = self.index_table(xpos)
+            lemma = table.get(surface)
+            if lemma is not None:
+                if self.stats is not None:
+                    self.stats.count("mutation_index")
+                return lemma
+        surface = self.normalise_surface(surface)
+        if self.lexicon is not None:
+            lemma = self.lexicon.lookup(surface, xpos)
+            if lemma is None and not surface.islower():
+                lemma = self.lexicon.lookup(surface.lower(), xpos)
+            if lemma is not None:
+                if self.stats is not None:
+                    self.stats.count("external_lexicon")
+                return lemma
         if xpos is None:
+            if self.stats is not None:
+                self.stats.count("untagged")
             surface = surface.lower()
             if surface in self.lemmata:
                 return(self.lemmata[surface])
             else:
                 return surface
-        for special in specials:
-            if xpos.startswith(special[0]):
-                return special[1]
-        if xpos[0:2] not in ["Nc", "Nn", "Nt", "Up", "Y"]:
-            surface = surface.lower()
+        handler = self.handlers.get(xpos)
+        if handler is None:
+            handler = self.handler(xpos)
+        return handler(surface)
+
+    def lemmatize_readings(self, surface: str) -> tuple:
+        """
+        Every distinct (XPOS family, lemma) reading of an untagged surface, sorted.
+
+        The surface is normalised once and then given to the handler of each tag in
+        reading_xposes, so each reading is what lemmatize would give with that tag.
+        """
+        normalised = self.normalise_surface(surface)
+        lowered = normalised.lower()
+        readings = set()
+        for family, xposes in self.reading_xposes.items():
+            for xpos in xposes:
+                lemma = None
+                if self.lexicon is not None:
+                    lemma = self.lexicon.lookup(normalised, xpos)
+                    if lemma is None and normalised != lowered:
+                        lemma = self.lexicon.lookup(lowered, xpos)
+                if lemma is None:
+                    handler = self.handlers.get(xpos)
+                    if handler is None:
+                        handler = self.handler(xpos)
+                    lemma = handler(normalised)
+                readings.add((family, lemma))
+        return tuple(sorted(readings))
+
+    def normalise_surface(self, surface: str) -> str:
+        """Straightens quotes and removes h-, t-, n- and dh' prefixes."""
+        return self.prefixes.sub("", self.straighten(surface))
+
+    def straighten(self, surface: str) -> str:
+        """Straightens quotes."""
+        surface = surface.replace('\xe2\x80\x99', "'").replace('\xe2\x80\x98', "'")
+        return surface.translate(self.quotes)
+
+    @staticmethod
+    def index_family(xpos: str) -> Optional[str]:
+        """The mutation index that can answer for xpos, if any."""
+        if xpos == "Nv":
+            return "vn"
+        if xpos.startswith("Nc") and not (xpos.endswith("e") or xpos.endswith("e*")):
+            return "noun"
+        if xpos[0:2] in ["Ap", "Aq", "Ar", "Av"] and xpos not in ["Apc", "Aps"]:
+            return "adjective"
+        return None
+
+    def index_table(self, xpos: str) -> dict:
+        """
+        The mutation index for xpos, empty if there is none, kept in index_tables.
+        Each family's index is a read-only table derived from the Registry, so it is built
+        once for all the lemmatizers using it.
+        """
+        with self.lock:
+            table = self.index_tables.get(xpos)
+            if table is None:
+                family = self.index_family(xpos)
+                if family is None:
+                    table = {}
+                else:
+                    table = self.resources.derived(
+                        ("mutation_index", family),
+                        lambda: MappingProxyType(self.build_index(family)))
+                self.index_tables[xpos] = table
+            return table
+
+    def build_index(self, family: str) -> dict:
+        """
+        Maps the variants of every table entry to what the cascade gives for them.
+
+        Variants are only kept if the cascade answers them from lemmata.csv or
+        verbal_nouns.csv, so that the index never disagrees with the rules.
+        A prefix is removed before anything else, so a prefixed form resolves
+        as the bare form would once its quotes are straightened.
+        """
+        resolve = getattr(self, f"resolve_{family}")
+        keys = list(self.lemmata)
+        if family == "vn":
+            keys += list(self.vns)
+        forms = set()
+        for key in keys:
+            for form in (key, key.lower(), key.capitalize()):
+                forms.add(form)
+                if len(form) > 1:
+                    forms.add(Morphology.lenite(form))
+        table = {}
+        for form in forms:
+            lemma = resolve(self.normalise_surface(form))
+            if lemma is not None:
+                table[form] = lemma
+            lemma = resolve(self.straighten(form))
+            if lemma is not None:
+                for prefix in self.mutation_prefixes:
+                    table[prefix + form] = lemma
+        return table
+
+    def resolve_noun(self, surface: str) -> Optional[str]:
+        """
+        What lemmatize_noun finds in lemmata.csv for a non-emphatic common noun,
+        given the normalised surface.
+        """
+        if surface.startswith("'"):
+            surface = surface[1:]
+        if surface == "O'":
+            return None
+        surface = Morphology.remove_final_apostrophe(Morphology.delenite(surface))
+        if surface in self.lemmata:
+            return self.lemmata[surface]
+        return self.lemmata.get(surface.lower())
+
+    def resolve_vn(self, surface: str) -> Optional[str]:
+        """
+        What lemmatize_noun finds in lemmata.csv or verbal_nouns.csv for Nv,
+        given the normalised surface.
+        """
+        surface = surface.lower()
+        if surface.startswith("'"):
+            surface = surface[1:]
+        surface = Morphology.remove_final_apostrophe(Morphology.delenite(surface))
+        if surface in self.lemmata:
+            return self.lemmata[surface]
+        return self.vns.get(surface)
+
+    def resolve_adjective(self, surface: str) -> Optional[str]:
+        """
+        What lemmatize_adjective finds in lemmata.csv for a positive adjective,
+        given the normalised surface.
+        """
+        return self.lemmata.get(
+            Morphology.remove_final_apostrophe(Morphology.delenite(surface.lower())))
+
+    def handler(self, xpos: str):
+        """The handler for xpos, built and kept in handlers the first time."""
+        with self.lock:
+            handler = self.handlers.get(xpos)
+            if handler is None:
+                handler = self.handlers[xpos] = self.build_handler(xpos)
+            return handler
+
+    def build_handler(self, xpos: str):
+        """
+        Works out once per XPOS which branch lemmatize takes and whether it lowercases.
+
+        Returns a function of the surface alone, which lemmatize keeps in self.handlers.
+        With instrumentation on, the function also times itself.
+        """
+        for prefix, lemma in self.specials:
+            if xpos.startswith(prefix):
+                handler = lambda surface: lemma
+                break
+        else:
+            handler = self.route(xpos)
+            if xpos[0:2] not in self.cased:
+                handler = lambda surface, route=handler: route(surface.lower())
+        if self.stats is not None:
+            handler = self.stats.timed(xpos[0:2], handler)
+        return handler
+
+    def route(self, xpos: str):
+        """
+        The branch of the cascade for xpos, as a function of the surface.
+
+        Methods are looked up when called so that cached versions are used.
+        """
         if xpos in ["Cc", "Cs"]:
-            return self.lemmatizer.lemmatize_conjunction(surface)
+            return lambda surface: self.lemmatizer.lemmatize_conjunction(surface)
         if xpos.startswith("R") or xpos == "I":
-            if surface in self.lemmata:
-                return(self.lemmata[surface])
-            if surface not in ["bhuel", "chaoidh", "cho", "fhathast", "mhmm",
-                               "thall", "thairis", "thì"]:
-                return Morphology.delenite(surface)
+            return self.lemmatize_adverb
         if xpos[0:2] in ["Ap", "Aq", "Ar", "Av"]:
-            return self.lemmatize_adjective(surface, xpos)
+            return lambda surface: self.lemmatize_adjective(surface, xpos)
         if xpos[0:2] in ["Mc", "Mo"]:
-            return self.lemmatize_number(surface)
+            return lambda surface: self.lemmatize_number(surface)
         if xpos[0:2] in ["Qa", "Qn"]:
-            return self.lemmatize_particle(surface)
+            return lambda surface: self.lemmatize_particle(surface)
         if xpos[0:2] in ["Sa", "Sp", "Pr", "Nf"]:
-            return self.lemmatizer.lemmatize_preposition(surface)
+            return lambda surface: self.lemmatizer.lemmatize_preposition(surface)
         if xpos.startswith("Pp") or xpos == "Px":
-            return self.lemmatizer.lemmatize_pronoun(surface)
+            return lambda surface: self.lemmatizer.lemmatize_pronoun(surface)
         if xpos.startswith("V"):
-            return self.lemmatize_verb(surface, xpos)
+            return lambda surface: self.lemmatize_verb(surface, xpos)
         if xpos.startswith("N"):
-            return self.lemmatize_noun(surface, xpos)
+            return lambda surface: self.lemmatize_noun(surface, xpos)
         if xpos.startswith("Dd"):
-            if surface == "'sa":
-                return "sa"
-            else:
-                return surface
+            return lambda surface: "sa" if surface == "'sa" else surface
         if xpos.startswith("Dp"):
-            return self.lemmatize_possessive(xpos)
-        if xpos in ["Dq", "Up"] and surface in self.lemmata:
-            return self.lemmata[surface]
+            return lambda surface: self.lemmatize_possessive(xpos)
+        if xpos in ["Dq", "Up"]:
+            return lambda surface: self.lemmata.get(surface, surface)
         if xpos == "Xfe":
+            return Morphology.delenite
+        return lambda surface: surface
+
+    def lemmatize_adverb(self, surface: str) -> str:
+        """
+        Also used for interjections. A handful of words keep their initial lenition.
+        """
+        if surface in self.lemmata:
+            if self.stats is not None:
+                self.stats.count("adverb_lexicon")
+            return self.lemmata[surface]
+        if surface not in self.unlenited:
+            if self.stats is not None:
+                self.stats.count("adverb_delenite")
             return Morphology.delenite(surface)
+        if self.stats is not None:
+            self.stats.count("adverb_unchanged")
         return surface
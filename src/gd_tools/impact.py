@@ -0,0 +1,177 @@
+"""
+Lexicon-change impact index.
+
+Records, for every distinct (form, XPOS) in a corpus, which keys of lemmata.csv and
+verbal_nouns.csv the lemmatizer looked up and what it found there. A lemma depends only
+on the form, the XPOS and the answers to those lookups, so after the resources are edited
+only the words with a recorded lookup whose answer has changed need lemmatizing again.
+
+    $ gd-tools impact corpus.conllu corpus.impact
+    $ gd-tools impact-diff corpus.impact --update
+"""
+from collections.abc import Mapping
+import json
+from pathlib import Path
+from typing import Iterable, Optional
+from gd_tools.conllu import FORM, ID, XPOS, is_word
+from gd_tools.core import Lemmatizer_xpos
+from gd_tools.registry import Registry
+
+class RecordingTable(Mapping):
+    """Read-only view of a table which adds the keys looked up in it to probes."""
+    def __init__(self, name: str, table: Mapping, probes: set):
+        self.name = name
+        self.table = table
+        self.probes = probes
+
+    def __contains__(self, key) -> bool:
+        self.probes.add((self.name, key))
+        return key in self.table
+
+    def __getitem__(self, key):
+        self.probes.add((self.name, key))
+        return self.table[key]
+
+    def get(self, key, default=None):
+        self.probes.add((self.name, key))
+        return self.table.get(key, default)
+
+    def __iter__(self):
+        return iter(self.table)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+class ImpactIndex:
+    """
+    Maps lexicon keys to the (form, XPOS) types which consult them, and types to the
+    (sentence, word ID) positions where they occur.
+
+    Lemmatizing goes through a Lemmatizer_xpos without the mutation index, whose single
+    probes hide which table entries a form depends on. The index keeps the lemma of each
+    type and what each lookup found, so the old resources are not needed to find the
+    changes.
+    """
+    version = 1
+    tables = {"lemmata": "lemmata", "verbal_nouns": "vns"}
+
+    def __init__(self, resources: Optional[Registry] = None):
+        self.resources = resources or Registry.shared()
+        self.sentences = 0
+        self.lemmas = {}
+        self.positions = {}
+        self.lookups = {}
+        self.found = {name: {} for name in self.tables}
+        self.consulted = {}
+
+    def lemmatizer(self, resources: Registry, probes: set) -> Lemmatizer_xpos:
+        """An uncached Lemmatizer_xpos whose lemmata and verbal noun lookups go into probes."""
+        lemmatizer = Lemmatizer_xpos(resources=resources, index=False)
+        for name, attribute in self.tables.items():
+            table = RecordingTable(name, getattr(resources, name)(), probes)
+            setattr(lemmatizer, attribute, table)
+            if name == "lemmata":
+                lemmatizer.lemmatizer.lemmata = table
+        return lemmatizer
+
+    def add(self, sentences: Iterable[list]) -> int:
+        """
+        Lemmatizes each new type in sentences and records where it occurs. Returns words.
+        Positions use the sent_id comment, or else the number of the sentence from 0.
+        """
+        probes = set()
+        lemmatizer = self.lemmatizer(self.resources, probes)
+        words = 0
+        for sentence in sentences:
+            sent_id = str(self.sentences)
+            self.sentences += 1
+            for line in sentence:
+                if isinstance(line, str):
+                    if line.startswith("# sent_id = "):
+                        sent_id = line[len("# sent_id = "):].strip()
+                elif is_word(line):
+                    key = (line[FORM], None if line[XPOS] == "_" else line[XPOS])
+                    if key not in self.lemmas:
+                        self.record(key, lemmatizer, probes, self.resources)
+                    self.positions.setdefault(key, []).append((sent_id, line[ID]))
+                    words += 1
+        return words
+
+    def record(self, key: tuple, lemmatizer: Lemmatizer_xpos, probes: set,
+               resources: Registry):
+        """Lemmatizes one type and notes every lookup it made and what it found."""
+        probes.clear()
+        self.lemmas[key] = lemmatizer.lemmatize(*key)
+        for lookup in self.lookups.get(key, ()):
+            self.consulted.get(lookup, set()).discard(key)
+        self.lookups[key] = tuple(sorted(probes))
+        for name, entry in probes:
+            self.found[name][entry] = getattr(resources, name)().get(entry)
+            self.consulted.setdefault((name, entry), set()).add(key)
+
+    def changed(self, resources: Registry) -> list:
+        """(table, key) for every recorded lookup which resources now answer differently."""
+        result = []
+        for name, found in self.found.items():
+            table = getattr(resources, name)()
+            result.extend((name, entry) for entry, value in found.items()
+                          if table.get(entry) != value)
+        return sorted(result)
+
+    def affected(self, resources: Registry) -> set:
+        """The types which consulted a changed lookup."""
+        return {key for lookup in self.changed(resources)
+                for key in self.consulted.get(lookup, ())}
+
+    def update(self, resources: Registry) -> list:
+        """
+        Lemmatizes the affected types again with resources, which become the index's own.
+        Returns (sentence, word ID, form, XPOS, old lemma, new lemma) for each word whose
+        lemma changed, in the order the types were first seen.
+        """
+        affected = self.affected(resources)
+        probes = set()
+        lemmatizer = self.lemmatizer(resources, probes)
+        for name in self.found:
+            table = getattr(resources, name)()
+            self.found[name] = {entry: table.get(entry) for entry in self.found[name]}
+        changes = []
+        for key in [key for key in self.lemmas if key in affected]:
+            old = self.lemmas[key]
+            self.record(key, lemmatizer, probes, resources)
+            if self.lemmas[key] != old:
+                changes.extend((sent_id, word_id, key[0], key[1], old, self.lemmas[key])
+                               for sent_id, word_id in self.positions[key])
+        self.resources = resources
+        return changes
+
+    def save(self, path):
+        """Writes the index as JSON."""
+        types = [[form, xpos, self.lemmas[(form, xpos)],
+                  [list(lookup) for lookup in self.lookups[(form, xpos)]],
+                  [list(position) for position in self.positions[(form, xpos)]]]
+                 for form, xpos in self.lemmas]
+        data = {"version": self.version, "sentences": self.sentences, "found": self.found,
+                "types": types}
+        Path(path).write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path, resources: Optional[Registry] = None) -> "ImpactIndex":
+        """
+        Reads an index written by save. resources should be what it was built with;
+        they are only used to lemmatize words added later.
+        """
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if data.get("version") != cls.version:
+            raise ValueError(f"{path} is not a version {cls.version} impact index")
+        index = cls(resources)
+        index.sentences = data["sentences"]
+        index.found = {name: data["found"].get(name, {}) for name in cls.tables}
+        for form, xpos, lemma, lookups, positions in data["types"]:
+            key = (form, xpos)
+            index.lemmas[key] = lemma
+            index.lookups[key] = tuple((name, entry) for name, entry in lookups)
+            index.positions[key] = [tuple(position) for position in positions]
+            for lookup in index.lookups[key]:
+                index.consulted.setdefault(lookup, set()).add(key)
+        return index
@@ -0,0 +1,105 @@
+"""
+Full-form lexicon backends for the lemmatizers.
+
+A lexicon maps a form, optionally with its XPOS, to a lemma. The lemmatizers consult it
+before their rules, so a large lexicon of attested forms can override them.
+"""
+from abc import ABC, abstractmethod
+import mmap
+from typing import Iterable, Optional
+
+class Lexicon(ABC):
+    """
+    Interface for lexicon backends.
+
+    Entries are (form, xpos, lemma) triples. An empty xpos means the entry applies
+    whatever the XPOS; entries with an XPOS take priority.
+    """
+    @abstractmethod
+    def lookup(self, form: str, xpos: Optional[str] = None) -> Optional[str]:
+        """The lemma of form with xpos, or of form alone, or None."""
+
+class DictLexicon(Lexicon):
+    """In-memory lexicon, for small tables and for testing."""
+    def __init__(self, entries: Iterable[tuple]):
+        self.entries = {}
+        for form, xpos, lemma in entries:
+            self.entries.setdefault((form, xpos or ""), lemma)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, form: str, xpos: Optional[str] = None) -> Optional[str]:
+        if xpos:
+            lemma = self.entries.get((form, xpos))
+            if lemma is not None:
+                return lemma
+        return self.entries.get((form, ""))
+
+class MmapLexicon(Lexicon):
+    """
+    Sorted on-disk lexicon read through a read-only memory map.
+
+    The file is a header line followed by form TAB xpos TAB lemma lines sorted by the
+    UTF-8 bytes of form TAB xpos. Lookups are binary searches over the map, so nothing
+    is loaded into Python objects and every process using the file shares the OS page cache.
+    """
+    header = b"#gd_tools lexicon 1\n"
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(self.header)] != self.header:
+            self.map.close()
+            raise ValueError(f"{path} is not a gd_tools lexicon")
+        self.start = len(self.header)
+
+    @classmethod
+    def build(cls, entries: Iterable[tuple], path) -> int:
+        """
+        Writes entries to path in lookup order and returns how many were written.
+        Where a form and XPOS occur more than once, the first lemma wins.
+        """
+        lines = {}
+        for form, xpos, lemma in entries:
+            xpos = xpos or ""
+            if any(char in field for field in (form, xpos, lemma) for char in "\t\n"):
+                raise ValueError(f"tab or newline in lexicon entry {(form, xpos, lemma)!r}")
+            key = f"{form}\t{xpos}".encode("utf-8")
+            if key not in lines:
+                lines[key] = key + b"\t" + lemma.encode("utf-8") + b"\n"
+        with open(path, "wb") as file:
+            file.write(cls.header)
+            for key in sorted(lines):
+                file.write(lines[key])
+        return len(lines)
+
+    def close(self):
+        self.map.close()
+
+    def find(self, key: bytes) -> Optional[bytes]:
+        """Binary search for the line whose form TAB xpos is key; returns its lemma."""
+        data = self.map
+        low, high = self.start, len(data)
+        while low < high:
+            middle = (low + high) // 2
+            start = data.rfind(b"\n", low, middle) + 1 or low
+            end = data.find(b"\n", start)
+            split = data.find(b"\t", data.find(b"\t", start, end) + 1, end)
+            line_key = data[start:split]
+            if line_key < key:
+                low = end + 1
+            elif line_key > key:
+                high = start
+            else:
+                return data[split + 1:end]
+        return None
+
+    def lookup(self, form: str, xpos: Optional[str] = None) -> Optional[str]:
+        if xpos:
+            lemma = self.find(f"{form}\t{xpos}".encode("utf-8"))
+            if lemma is not None:
+                return lemma.decode("utf-8")
+        lemma = self.find(f"{form}\t".encode("utf-8"))
+        return None if lemma is None else lemma.decode("utf-8")
@@ -0,0 +1,112 @@
+"""
+Paradigm expansion.
+
+Generates the inflected forms predicted for the lemmas in lemmata.csv, verbal_nouns.csv and
+subcat.txt, tagged with ARCOSG XPOS, and keeps those which Lemmatizer_xpos maps back to their
+lemma. The result is a full-form table for DictLexicon or MmapLexicon.build, and a way to
+find the forms of a lemma for search.
+"""
+from typing import Iterator, Optional
+from gd_tools.core import Lemmatizer_xpos, Morphology
+from gd_tools.registry import Registry
+
+class ParadigmGenerator:
+    """
+    Predicts forms with simple orthographic rules and checks each against the lemmatizer.
+
+    Verbs come from subcat.txt and verbal_nouns.csv, verbal nouns from verbal_nouns.csv.
+    lemmata.csv does not say what part of speech a form is, so the forms listed there get
+    an empty XPOS, which the lexicon backends take to mean any XPOS, and are checked untagged.
+    """
+    slender = frozenset("eiéèíì")
+    vowels = frozenset("aeiouàèìòùáéíóú")
+    # XPOS: (lenited, broad ending, slender ending)
+    verb_forms = {
+        "V-s": (True, "", ""),
+        "V-s0": (True, "adh", "eadh"),
+        "V-f": (False, "aidh", "idh"),
+        "V-f--r": (True, "as", "eas"),
+        "V-f0": (False, "ar", "ear"),
+        "V-h": (True, "adh", "eadh"),
+        "V-h--d": (False, "adh", "eadh"),
+        "Vm-2s": (False, "", ""),
+        "Vm-1p": (False, "amaid", "eamaid"),
+        "Vm-2p": (False, "aibh", "ibh"),
+    }
+
+    def __init__(self, lemmatizer: Optional[Lemmatizer_xpos] = None, resources: Registry = None):
+        self.resources = resources or Registry.shared()
+        self.lemmatizer = lemmatizer or Lemmatizer_xpos(resources=self.resources)
+        self.rejected = 0
+        self.paradigms = None
+
+    def verbs(self) -> list:
+        """Every verb lemma in subcat.txt or verbal_nouns.csv, in a stable order."""
+        verbs = set(self.resources.verbal_nouns().values())
+        verbs.update(lemma for lemma in self.resources.subcat() if lemma != "default")
+        verbs.discard("")
+        return sorted(verbs)
+
+    def ending(self, lemma: str, broad: str, slender: str) -> str:
+        """The ending which agrees with the last vowel of lemma."""
+        for char in reversed(lemma):
+            if char in self.vowels:
+                return lemma + (slender if char in self.slender else broad)
+        return lemma + broad
+
+    def predict_verb(self, lemma: str) -> Iterator[tuple]:
+        """(surface, XPOS) for the finite forms of a verb."""
+        for xpos, (lenited, broad, slender) in self.verb_forms.items():
+            surface = self.ending(lemma, broad, slender)
+            if lenited:
+                if surface[:1] in self.vowels:
+                    surface = "dh'" + surface
+                elif surface.startswith("f"):
+                    surface = "dh'" + Morphology.lenite(surface)
+                elif len(surface) > 1:
+                    surface = Morphology.lenite(surface)
+            yield (surface, xpos)
+
+    def predict(self) -> Iterator[tuple]:
+        """(surface, XPOS, lemma) for every predicted form, before checking."""
+        for verb in self.verbs():
+            for surface, xpos in self.predict_verb(verb):
+                yield (surface, xpos, verb)
+        for noun, verb in self.resources.verbal_nouns().items():
+            yield (noun, "Nv", verb)
+            if len(noun) > 1:
+                yield (Morphology.lenite(noun), "Nv", verb)
+        for form, lemma in self.resources.lemmata().items():
+            yield (form, "", lemma)
+
+    def entries(self) -> Iterator[tuple]:
+        """
+        (surface, XPOS, lemma) for each predicted form that the lemmatizer maps back to its
+        lemma. rejected counts the others.
+        """
+        self.rejected = 0
+        seen = set()
+        for surface, xpos, lemma in self.predict():
+            if (surface, xpos) in seen:
+                continue
+            seen.add((surface, xpos))
+            if self.lemmatizer.lemmatize(surface, xpos or None) == lemma:
+                yield (surface, xpos, lemma)
+            else:
+                self.rejected += 1
+
+    def table(self) -> dict:
+        """(surface, XPOS) to lemma for every checked form."""
+        return {(surface, xpos): lemma for surface, xpos, lemma in self.entries()}
+
+    def forms(self, lemma: str) -> list:
+        """
+        The checked (surface, XPOS) pairs of lemma, for expanding a search.
+        Paradigms are generated on the first call.
+        """
+        if self.paradigms is None:
+            paradigms = {}
+            for surface, xpos, entry in self.entries():
+                paradigms.setdefault(entry, []).append((surface, xpos))
+            self.paradigms = paradigms
+        return list(self.paradigms.get(lemma, ()))
@@ -0,0 +1,328 @@
+"""Process-wide registry of the tables in gd_tools/resources."""
+import csv
+import hashlib
+import marshal
+import os
+from pathlib import Path
+import re
+import sys
+from threading import Lock, RLock
+import time
+from types import MappingProxyType
+from typing import Union
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ENV = "GD_TOOLS_SNAPSHOT"
+
+class Registry:
+    """
+    Loads each resource file once, on first use, and hands out shared read-only tables.
+
+    Every annotator takes the shared registry unless it is given another one,
+    for instance one pointing at a folder of edited resources.
+
+    If there is a snapshot written by write_snapshot, tables whose source files still have
+    the checksums recorded in it are read from there instead of being parsed.
+    snapshot is the path of the snapshot, by default snapshot.marshal in the resource
+    folder, or False to always parse. The shared registry takes its snapshot path from the
+    GD_TOOLS_SNAPSHOT environment variable if it is set, for when the package folder is
+    read-only.
+    """
+    tables = ("lemmata", "verbal_nouns", "prepositions", "preposition_matcher",
+              "retaggings", "subcat", "types", "splits")
+    sources = {"lemmata": "lemmata.csv", "verbal_nouns": "verbal_nouns.csv",
+               "prepositions": "prepositions.csv", "preposition_matcher": "prepositions.csv",
+               "retaggings": "retaggings.txt", "subcat": "subcat.txt", "types": "types.txt",
+               "splits": "splits.csv"}
+    _shared = None
+    _shared_lock = Lock()
+
+    def __init__(self, folder=None, snapshot: Union[str, Path, bool, None] = None):
+        self.folder = Path(folder) if folder else Path(__file__).parent / "resources"
+        if snapshot is False:
+            self.snapshot = None
+        else:
+            self.snapshot = Path(snapshot) if snapshot else self.folder / "snapshot.marshal"
+        self.snapshot_read = self.snapshot is None
+        self.loaded = {}
+        self.derivations = {}
+        self.costs = {}
+        self.lock = RLock()
+
+    @classmethod
+    def shared(cls):
+        """The registry for the package's own resources."""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls(snapshot=os.environ.get(SNAPSHOT_ENV) or None)
+        return cls._shared
+
+    def get(self, name: str):
+        """Returns the table called name, loading it if need be."""
+        table = self.loaded.get(name)
+        if table is None:
+            with self.lock:
+                if not self.snapshot_read:
+                    self.read_snapshot()
+                table = self.loaded.get(name)
+                if table is None:
+                    start = time.perf_counter()
+                    table = getattr(self, "load_" + name)()
+                    self.costs[name] = {"ms": (time.perf_counter() - start) * 1000,
+                                        "bytes": Registry.sizeof(table)}
+                    self.loaded[name] = table
+        return table
+
+    def derived(self, key, build):
+        """
+        A table which build computes from this registry's tables, built once and shared by
+        everything using the registry. Derived tables are never written to the snapshot.
+        """
+        table = self.derivations.get(key)
+        if table is None:
+            with self.lock:
+                table = self.derivations.get(key)
+                if table is None:
+                    table = self.derivations[key] = build()
+        return table
+
+    def checksums(self) -> dict:
+        """SHA-256 of each source file, by file name."""
+        result = {}
+        for filename in sorted(set(self.sources.values())):
+            path = self.folder / filename
+            if path.exists():
+                result[filename] = hashlib.sha256(path.read_bytes()).hexdigest()
+        return result
+
+    def fingerprint(self) -> str:
+        """SHA-256 over the checksums of every source file, which changes when any of them does."""
+        digest = hashlib.sha256()
+        for filename, checksum in self.checksums().items():
+            digest.update(f"{filename}\t{checksum}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def read_snapshot(self):
+        """
+        Takes every table whose source file is unchanged from the snapshot.
+        A missing, unreadable or out-of-date snapshot is simply ignored.
+        """
+        self.snapshot_read = True
+        start = time.perf_counter()
+        try:
+            data = marshal.loads(self.snapshot.read_bytes())
+        except (OSError, EOFError, ValueError, TypeError):
+            return
+        if not isinstance(data, dict) or \
+                data.get("version") != (SNAPSHOT_VERSION, tuple(sys.version_info[:2])):
+            return
+        checksums = self.checksums()
+        for name, (checksum, frozen) in data["tables"].items():
+            if name in self.sources and checksums.get(self.sources[name]) == checksum:
+                self.loaded[name] = Registry.thaw(name, frozen)
+        elapsed = (time.perf_counter() - start) * 1000
+        for name in data["tables"]:
+            if name in self.loaded:
+                self.costs[name] = {"ms": elapsed / len(self.loaded), "snapshot": True,
+                                    "bytes": Registry.sizeof(self.loaded[name])}
+
+    def write_snapshot(self, path=None) -> Path:
+        """
+        Parses every table afresh and writes them all, with the checksums of their
+        source files, to path or to the snapshot path of this registry.
+        """
+        path = Path(path) if path else (self.snapshot or self.folder / "snapshot.marshal")
+        checksums = self.checksums()
+        tables = {}
+        for name in self.names():
+            table = getattr(self, "load_" + name)()
+            tables[name] = (checksums.get(self.sources[name]), Registry.freeze(name, table))
+        data = {"version": (SNAPSHOT_VERSION, tuple(sys.version_info[:2])), "tables": tables}
+        temporary = path.with_name(path.name + ".tmp")
+        temporary.write_bytes(marshal.dumps(data))
+        os.replace(temporary, path)
+        return path
+
+    @staticmethod
+    def freeze(name: str, table):
+        """Plain data which marshal can store. Compiled patterns are stored as their source."""
+        if name == "preposition_matcher":
+            return (table[0].pattern, table[1])
+        return dict(table)
+
+    @staticmethod
+    def thaw(name: str, frozen):
+        """Inverse of freeze."""
+        if name == "preposition_matcher":
+            return (re.compile(frozen[0]), frozen[1])
+        return MappingProxyType(frozen)
+
+    @staticmethod
+    def cold_start(folder=None, snapshot: Union[str, Path, bool, None] = None) -> float:
+        """
+        Milliseconds to load every table into a new registry, with the regular expression
+        cache emptied first. Pass snapshot=False to time parsing.
+        """
+        re.purge()
+        start = time.perf_counter()
+        Registry(folder, snapshot).load_all()
+        return (time.perf_counter() - start) * 1000
+
+    def load_all(self):
+        """Loads every table, for instance to warm up a worker process."""
+        for name in self.names():
+            self.get(name)
+
+    @classmethod
+    def names(cls) -> list:
+        """Names of all the tables the registry knows how to load."""
+        return list(cls.tables)
+
+    def report(self) -> dict:
+        """
+        Load time in milliseconds and approximate size in bytes for each table loaded so far.
+        """
+        return {name: dict(cost) for name, cost in self.costs.items()}
+
+    @staticmethod
+    def sizeof(table) -> int:
+        """
+        Approximate deep size of a table of strings, lists, tuples and dicts.
+
+        Compiled patterns count their own __sizeof__, which covers the compiled program,
+        plus the pattern string.
+        """
+        seen = set()
+        def size(obj):
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            result = sys.getsizeof(obj)
+            if isinstance(obj, MappingProxyType):
+                obj = dict(obj)
+            if isinstance(obj, dict):
+                result += sum(size(k) + size(v) for k, v in obj.items())
+            elif isinstance(obj, (list, tuple)):
+                result += sum(size(item) for item in obj)
+            elif isinstance(obj, re.Pattern):
+                result += size(obj.pattern)
+            return result
+        return size(table)
+
+    def lemmata(self) -> MappingProxyType:
+        """Irregular forms from lemmata.csv."""
+        return self.get("lemmata")
+
+    def verbal_nouns(self) -> MappingProxyType:
+        """Verbal noun to verb, inverted from verbal_nouns.csv."""
+        return self.get("verbal_nouns")
+
+    def prepositions(self) -> MappingProxyType:
+        """Regular expression to lemma, in file order."""
+        return self.get("prepositions")
+
+    def preposition_matcher(self) -> tuple:
+        """prepositions.csv compiled into one alternation, with the lemma for each group."""
+        return self.get("preposition_matcher")
+
+    def retaggings(self) -> MappingProxyType:
+        """XPOS to CCG tag."""
+        return self.get("retaggings")
+
+    def subcat(self) -> MappingProxyType:
+        """Verb lemma to subcategorisation frames, as tuples so they cannot be changed."""
+        return self.get("subcat")
+
+    def types(self) -> MappingProxyType:
+        """CCG tag to category."""
+        return self.get("types")
+
+    def splits(self) -> MappingProxyType:
+        """
+        Lower-cased fused form and XPOS to the (form, UPOS, XPOS) of each of its parts.
+        """
+        return self.get("splits")
+
+    def load_lemmata(self) -> MappingProxyType:
+        lemmata = {}
+        with open(self.folder / "lemmata.csv", encoding="utf-8") as file:
+            reader = csv.reader(filter(lambda row: row[0] != '#', file))
+            for row in reader:
+                lemmata[row[0]] = row[1]
+        return MappingProxyType(lemmata)
+
+    def load_verbal_nouns(self) -> MappingProxyType:
+        """A verb listed twice keeps only its last row."""
+        verbs = {}
+        with open(self.folder / "verbal_nouns.csv", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            for row in reader:
+                verbs[row[0]] = row[1].split(";")
+        vns = {}
+        for key in verbs:
+            for value in verbs[key]:
+                vns[value] = key
+        return MappingProxyType(vns)
+
+    def load_prepositions(self) -> MappingProxyType:
+        prepositions = {}
+        with open(self.folder / "prepositions.csv", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            for row in reader:
+                prepositions[row[0]] = row[1]
+        return MappingProxyType(prepositions)
+
+    def load_preposition_matcher(self) -> tuple:
+        """
+        Each pattern gets its own named group, so one match finds the lemma.
+        Python tries alternatives left to right, so the file order still decides.
+        """
+        prepositions = self.prepositions()
+        matcher = re.compile("|".join(
+            "(?P<p%d>%s)" % (i, pattern) for i, pattern in enumerate(prepositions)))
+        return (matcher, tuple(prepositions.values()))
+
+    def load_retaggings(self) -> MappingProxyType:
+        retaggings = {}
+        with open(self.folder / "retaggings.txt", encoding="utf-8") as file:
+            for line in file:
+                if not line.startswith("#"):
+                    tokens = line.split('\t')
+                    retaggings[tokens[0]] = tokens[1].strip()
+        return MappingProxyType(retaggings)
+
+    def load_subcat(self) -> MappingProxyType:
+        mappings = {}
+        mappings['default'] = ('TRANS', 'INTRANS')
+        subcats = ()
+        with open(self.folder / "subcat.txt", encoding="utf-8") as file:
+            for line in file:
+                if not line.startswith('#'):
+                    if re.match('^[0-9]', line):
+                        tokens = line.split()
+                        subcats = tuple(t.strip() for t in tokens[1:])
+                    else:
+                        mappings[line.strip()] = subcats
+        return MappingProxyType(mappings)
+
+    def load_types(self) -> MappingProxyType:
+        types = {}
+        with open(self.folder / "types.txt", encoding="utf-8") as file:
+            for line in file:
+                if not line.startswith("#"):
+                    tokens = line.split('\t')
+                    types[tokens[0]] = tokens[1].strip()
+        return MappingProxyType(types)
+
+    def load_splits(self) -> MappingProxyType:
+        """The first row for a form and XPOS wins."""
+        splits = {}
+        with open(self.folder / "splits.csv", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            next(reader)
+            for row in reader:
+                if row:
+                    splits.setdefault((row[0].lower(), row[1]),
+                                      (tuple(row[2:5]), tuple(row[5:8])))
+        return MappingProxyType(splits)
@@ -0,0 +1,233 @@
+"""
+Long-running annotation server.
+
+Keeps the annotators warm and answers newline-delimited JSON requests over a Unix socket
+or a localhost TCP port, one JSON object per line in each direction:
+
+    {"op": "annotate", "forms": ["Bha", "an", "cù"], "xpos": ["V-s", "Tdsm", "Ncsmn"]}
+    {"op": "annotate", "forms": [...], "xpos": [...], "annotations": ["lemma", "retag"]}
+    {"op": "normalise", "text": "Tha e 'na thigh mór."}
+    {"op": "stats"}
+
+Any "id" in a request is echoed in its response. Concurrent annotate requests are merged
+into micro-batches for BatchAnnotator, each request counting as its own sentence.
+
+    $ gd-tools serve --socket /tmp/gd_tools.sock
+"""
+import asyncio
+from collections import deque
+import json
+import time
+from typing import Optional
+from gd_tools.batch import BatchAnnotator
+from gd_tools.core import GOC
+
+class Server:
+    """
+    Micro-batching annotation server.
+
+    A batch is sent to the annotators when it reaches max_batch tokens or when its first
+    request has waited max_delay seconds, whichever comes first. Batches are annotated one
+    at a time in a worker thread, so the event loop keeps accepting requests meanwhile.
+    """
+    def __init__(self, batch: Optional[BatchAnnotator] = None, goc: Optional[GOC] = None,
+                 max_batch: int = 1024, max_delay: float = 0.002):
+        self.batch = batch or BatchAnnotator()
+        self.goc = goc or GOC()
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = None
+        self.server = None
+        self.batcher = None
+        self.latencies = deque(maxlen=10000)
+        self.requests = 0
+        self.batches = 0
+        self.batched_requests = 0
+
+    async def start(self, path: Optional[str] = None, host: str = "127.0.0.1",
+                    port: int = 0) -> asyncio.AbstractServer:
+        """Listens on the Unix socket path if given, otherwise on host and port."""
+        self.queue = asyncio.Queue()
+        self.batcher = asyncio.get_running_loop().create_task(self.run_batches())
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+        try:
+            await self.batcher
+        except asyncio.CancelledError:
+            pass
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answers one connection's requests in order until it closes."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = await self.respond(line)
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, line: bytes) -> dict:
+        """The response to one request line, or {"error": ...}."""
+        start = time.perf_counter()
+        request = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            op = request.get("op")
+            if op == "annotate":
+                response = await self.annotate(request)
+            elif op == "normalise":
+                response = {"text": "".join(self.goc.normalise_text(
+                    str(request.get("text", "")).splitlines(True)))}
+            elif op == "stats":
+                response = self.stats()
+            else:
+                raise ValueError(f"unknown op {op!r}")
+        except (ValueError, TypeError) as error:
+            response = {"error": str(error)}
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+        self.requests += 1
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        return response
+
+    async def annotate(self, request: dict) -> dict:
+        """Checks the request and queues it for the next batch."""
+        forms, xposes = request.get("forms"), request.get("xpos")
+        if not isinstance(forms, list) or not isinstance(xposes, list) \
+                or len(forms) != len(xposes):
+            raise ValueError("forms and xpos must be lists of the same length")
+        annotations = request.get("annotations", ["lemma", "feats"])
+        if not isinstance(annotations, list) or \
+                not all(isinstance(name, str) for name in annotations):
+            raise ValueError("annotations must be a list of strings")
+        annotations = tuple(annotations)
+        unknown = set(annotations) - set(BatchAnnotator.annotations)
+        if unknown:
+            raise ValueError(f"unknown annotations {sorted(unknown)}")
+        tags = request.get("tags")
+        if "type" in annotations and (not isinstance(tags, list) or len(tags) != len(forms)):
+            raise ValueError("type needs a CCG tag for each token")
+        feats = request.get("feats")
+        if feats is not None and (not isinstance(feats, list) or len(feats) != len(forms)):
+            raise ValueError("feats must be a list with one object per token")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((annotations, forms, xposes, feats, tags, future))
+        return await future
+
+    async def run_batches(self):
+        """Collects queued requests into batches and annotates them until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            tokens = len(pending[0][1])
+            deadline = loop.time() + self.max_delay
+            while tokens < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                tokens += len(item[1])
+            self.batches += 1
+            self.batched_requests += len(pending)
+            try:
+                results = await loop.run_in_executor(None, self.annotate_batch, pending)
+            except Exception as error:  # pylint: disable=broad-except
+                results = [{"error": str(error)} for _ in pending]
+            for item, result in zip(pending, results):
+                if not item[-1].done():
+                    item[-1].set_result(result)
+
+    def annotate_batch(self, pending: list) -> list:
+        """
+        Annotates queued requests, one BatchAnnotator call per set of annotations,
+        and returns a JSON-ready response for each.
+        If a merged call fails, its requests are retried one by one so that a single bad
+        token only spoils its own request.
+        """
+        results = [None] * len(pending)
+        groups = {}
+        for i, item in enumerate(pending):
+            groups.setdefault(item[0], []).append(i)
+        for annotations, indices in groups.items():
+            items = [pending[i] for i in indices]
+            try:
+                group = self.annotate_group(annotations, items)
+            except Exception:  # pylint: disable=broad-except
+                group = []
+                for item in items:
+                    try:
+                        group.extend(self.annotate_group(annotations, [item]))
+                    except Exception as error:  # pylint: disable=broad-except
+                        group.append({"error": f"{type(error).__name__}: {error}"})
+            for i, result in zip(indices, group):
+                results[i] = result
+        return results
+
+    def annotate_group(self, annotations: tuple, items: list) -> list:
+        """One BatchAnnotator call for requests that want the same annotations."""
+        forms, xposes, feats, tags, starts = [], [], [], [], []
+        for _, item_forms, item_xposes, item_feats, item_tags, _ in items:
+            starts.append(len(forms))
+            forms.extend(item_forms)
+            xposes.extend(item_xposes)
+            feats.extend(item_feats or [{}] * len(item_forms))
+            tags.extend(item_tags or [None] * len(item_forms))
+        output = self.batch.annotate(forms, xposes, feats, BatchAnnotator.previous(xposes, starts),
+                                     tags, annotations)
+        ends = starts[1:] + [len(forms)]
+        return [{name: [Server.jsonable(value) for value in output[name][start:end]]
+                 for name in annotations}
+                for start, end in zip(starts, ends)]
+
+    @staticmethod
+    def jsonable(value):
+        """FEATS mappings become objects and tuples become lists."""
+        if value is None or isinstance(value, str):
+            return value
+        if isinstance(value, tuple):
+            return list(value)
+        return {key: list(values) for key, values in value.items()}
+
+    def stats(self) -> dict:
+        """Request latency percentiles in milliseconds, queue depth and batching counts."""
+        latencies = sorted(self.latencies)
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+        return {"requests": self.requests, "queue_depth": self.queue.qsize(),
+                "batches": self.batches,
+                "mean_batch_requests": self.batched_requests / self.batches if self.batches else 0,
+                "latency_ms": {"p50": percentile(0.5), "p90": percentile(0.9),
+                               "p99": percentile(0.99)}}
+
+async def serve(path: Optional[str] = None, host: str = "127.0.0.1", port: int = 8765,
+                **options):
+    """Runs a Server until cancelled."""
+    server = Server(**options)
+    listener = await server.start(path, host, port)
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.close()
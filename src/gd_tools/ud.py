@@ -1,11 +1,13 @@
-import os
-import csv
-import re
+import threading
+from types import MappingProxyType
 
 class Features:
     """
     Assigns Scottish Gaelic UD features based on ARCOSG POS tags.
     These methods generate a dictionary as per the UD guidelines.
+
+    One instance can be shared between threads: the lookup tables do not change after
+    construction and results are added to the memo table under a lock.
     """
     def __init__(self):
         self.cases = {'n':'Nom', 'd':'Dat', 'g':'Gen', 'v':'Voc'}
@@ -19,10 +21,43 @@ class Features:
                             "Up":"Pat", "Uo":"Num"}
         self.polartypes_q = {"Qn":"Neg", "Qnr":"Neg", "Qnm":"Neg"}
         self.prontypes_q = {"Q-r": "Rel", "Qnr": "Rel", "Qq": "Int", "Uq": "Int"}
+        self.lock = threading.Lock()
+        self.table = {}
 
-    def feats(self, xpos: str, feats: dict, prev_xpos: str = "") -> dict:
+    def feats(self, xpos: str, feats: dict, prev_xpos: str = "") -> MappingProxyType:
         """
         Assign UD features based on an ARCOSG XPOS.
+
+        The result is a shared read-only mapping with tuples as values. It is worked out
+        once per XPOS, or per XPOS and preceding XPOS for Nv, or per XPOS and Typo for nouns.
+        feats is never modified.
+        """
+        if xpos == "Nv":
+            key = (xpos, prev_xpos)
+        elif xpos.startswith("N"):
+            key = (xpos, "Typo" in feats)
+            feats = {"Typo": ["Yes"]} if key[1] else {}
+        elif xpos.startswith("M") and feats:
+            return Features.freeze(self.build_feats(xpos, feats, prev_xpos))
+        else:
+            key = xpos
+        result = self.table.get(key)
+        if result is None:
+            with self.lock:
+                result = self.table.get(key)
+                if result is None:
+                    result = self.table[key] = Features.freeze(
+                        self.build_feats(xpos, feats, prev_xpos))
+        return result
+
+    @staticmethod
+    def freeze(feats: dict) -> MappingProxyType:
+        """Read-only copy of a dictionary of lists."""
+        return MappingProxyType({key: tuple(value) for key, value in feats.items()})
+
+    def build_feats(self, xpos: str, feats: dict, prev_xpos: str = "") -> dict:
+        """
+        Works out the features for xpos from scratch, as a new dictionary of lists.
         """
         if xpos.startswith("A"):
             return self.feats_adj(xpos)
@@ -122,7 +157,7 @@ class Features:
         """
         Marks NumForm and NumType based on XPOS.
         """
-        result = feats
+        result = dict(feats)
         if xpos in self.numtypes:
             result["NumType"] = [self.numtypes[xpos]]
         if xpos in self.numforms:
@@ -0,0 +1,20 @@
+"""
+Shared test fixtures.
+"""
+from pathlib import Path
+import shutil
+import tempfile
+import unittest
+from gd_tools.registry import Registry
+
+class ResourcesTestCase(unittest.TestCase):
+    """
+    Gives each test a temporary folder with a copy of the resources in folder/resources,
+    without any snapshot, for tests which edit them. The folder is removed afterwards.
+    """
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.resources = Path(self.folder.name) / "resources"
+        shutil.copytree(Registry.shared().folder, self.resources,
+                        ignore=shutil.ignore_patterns("snapshot.marshal*"))
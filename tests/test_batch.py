@@ -0,0 +1,94 @@
+"""Tests column-oriented batch annotation."""
+import unittest
+from gd_tools.batch import BatchAnnotator
+from gd_tools.core import Lemmatizer_xpos
+
+class CountingLemmatizer(Lemmatizer_xpos):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def lemmatize(self, surface, xpos=None):
+        self.calls += 1
+        return super().lemmatize(surface, xpos)
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.lemmatizer = CountingLemmatizer()
+        self.batch = BatchAnnotator(self.lemmatizer)
+
+    def tearDown(self):
+        self.batch = None
+
+    def test_types_once(self):
+        """Each distinct (form, XPOS) is lemmatized once; results come back in token order."""
+        forms = ["cait", "a", "cait", "cait", "a"]
+        xposes = ["Ncpmn", "Sa", "Ncpmn", "Ncpmg", "Sa"]
+        result = self.batch.annotate(forms, xposes, annotations=["lemma"])
+        self.assertEqual(["cat", "a", "cat", "cat", "a"], result["lemma"])
+        self.assertEqual(3, self.lemmatizer.calls)
+
+    def test_verbal_noun(self):
+        """The same Nv gets different FEATS after a preposition and after a possessive."""
+        forms = ["ag", "bualadh", "gu", "a", "bualadh", "bualadh"]
+        xposes = ["Sa", "Nv", "Sp", "Dp3sm", "Nv", "Nv"]
+        feats = self.batch.annotate(forms, xposes)["feats"]
+        self.assertEqual({"VerbForm": ("Vnoun",)}, dict(feats[1]))
+        self.assertEqual({"VerbForm": ("Inf",)}, dict(feats[4]))
+        self.assertEqual({"VerbForm": ("Vnoun",)}, dict(feats[5]))
+
+    def test_sentences(self):
+        """Nothing precedes the first word of a sentence, and untagged words are skipped."""
+        xposes = ["Ug", "Nv", None, "Nv", "Dp3sm", None, "Nv"]
+        self.assertEqual(["", "Ug", "Nv", "", "Nv", "Dp3sm", "Dp3sm"],
+                         BatchAnnotator.previous(xposes, [0, 3]))
+
+    def test_typo(self):
+        """Typo on a noun is kept apart from the same noun without it."""
+        feats = self.batch.annotate(["bhàrd", "bhàrd"], ["Ncsmg", "Ncsmg"],
+                                    feats=[{"Typo": ["Yes"]}, {}])["feats"]
+        self.assertIn("Typo", feats[0])
+        self.assertNotIn("Typo", feats[1])
+
+    def test_untagged(self):
+        result = self.batch.annotate(["Bha", "an"], [None, "Tdsm"],
+                                     annotations=["lemma", "feats", "retag"])
+        self.assertEqual("bi", result["lemma"][0])
+        self.assertIsNone(result["feats"][0])
+        self.assertIsNone(result["retag"][0])
+        self.assertEqual(("DET",), result["retag"][1])
+
+    def test_type(self):
+        result = self.batch.annotate(["bhuail", "bhuail"], ["V-s", "V-s"], tags=["BUAIL"] * 2,
+                                     annotations=["type"])
+        self.assertIs(result["type"][0], result["type"][1])
+        with self.assertRaises(ValueError):
+            self.batch.annotate(["bhuail"], ["V-s"], annotations=["type"])
+
+    def test_readings(self):
+        result = self.batch.annotate(["chunnaic", "Chunnaic", "chunnaic"], [None, "V-s", "V-s"],
+                                     annotations=["readings"])
+        self.assertIs(result["readings"][0], result["readings"][2])
+        self.assertIn(("V", "faic"), result["readings"][1])
+
+    def test_threads(self):
+        """A thread pool gives the same columns as a single thread."""
+        forms = ["cait", "a", "bhuail", "bualadh", "chunnaic", "cait"] * 50
+        xposes = ["Ncpmn", "Sa", "V-s", "Nv", None, "Ncpmg"] * 50
+        annotations = ["lemma", "feats", "retag", "readings"]
+        threaded = BatchAnnotator(threads=4)
+        try:
+            self.assertEqual(threaded.annotate(forms, xposes, annotations=annotations),
+                             self.batch.annotate(forms, xposes, annotations=annotations))
+        finally:
+            threaded.close()
+        self.assertIsNone(threaded.executor)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.batch.annotate(["a"], [], annotations=["lemma"])
+        with self.assertRaises(ValueError):
+            self.batch.annotate(["a"], ["Sa"], annotations=["stem"])
+
+if __name__ == '__main__':
+    unittest.main()
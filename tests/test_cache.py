@@ -0,0 +1,86 @@
+"""Tests the sentence cache for incremental re-annotation."""
+import gc
+import io
+from pathlib import Path
+import tempfile
+import unittest
+import warnings
+from gd_tools import cli
+from gd_tools.cache import AnnotationCache
+from gd_tools.conllu import Annotator, read_sentences, write_sentence
+
+SAMPLE = Path(__file__).parent / "resources" / "test_sentences.conllu"
+
+class TestAnnotationCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / "sentences.cache"
+        self.text = SAMPLE.read_text(encoding="utf-8")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def annotate(self, text: str, cache: AnnotationCache) -> str:
+        sentences = list(read_sentences(text.splitlines(True)))
+        Annotator(cache=cache).annotate_sentences(sentences)
+        return "".join(write_sentence(sentence) for sentence in sentences)
+
+    def test_reuse(self):
+        """Unchanged sentences come from the cache with the same annotation."""
+        expected = self.annotate(self.text, None)
+        cache = AnnotationCache(self.path, "a")
+        self.assertEqual(self.annotate(self.text, cache), expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        self.assertEqual(self.annotate(self.text, cache), expected)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        cache.close()
+
+    def test_edit(self):
+        """Only the edited sentence is annotated again."""
+        cache = AnnotationCache(self.path, "a")
+        self.annotate(self.text, cache)
+        edited = self.text.replace("bruidhinn", "bualadh")
+        self.assertIn("\tbuail\t", self.annotate(edited, cache))
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        cache.close()
+
+    def test_feats(self):
+        """Input FEATS are part of the key, since Typo changes the output."""
+        words = [["1", "bhàrd", "_", "NOUN", "Ncsmg", "_"] + ["_"] * 4]
+        typo = [["1", "bhàrd", "_", "NOUN", "Ncsmg", "Typo=Yes"] + ["_"] * 4]
+        self.assertNotEqual(AnnotationCache.key(words), AnnotationCache.key(typo))
+
+    def test_fingerprint(self):
+        """Opening the cache with another fingerprint empties it."""
+        cache = AnnotationCache(self.path, "a")
+        self.annotate(self.text, cache)
+        cache.close()
+        cache = AnnotationCache(self.path, "b")
+        self.annotate(self.text, cache)
+        self.assertEqual(cache.hits, 0)
+        cache.close()
+        self.assertNotEqual(AnnotationCache.fingerprint_of(),
+                            AnnotationCache.fingerprint_of(split=True))
+
+    def test_cli(self):
+        """Cached runs match uncached ones, with one job and with two."""
+        expected = io.StringIO()
+        cli.annotate(io.StringIO(self.text * 5), expected)
+        for jobs in [1, 2, 2]:
+            out = io.StringIO()
+            self.assertEqual(cli.annotate(io.StringIO(self.text * 5), out, jobs=jobs,
+                                          chunk_size=1, cache=str(self.path)), 50)
+            self.assertEqual(out.getvalue(), expected.getvalue())
+
+    def test_cli_closes(self):
+        """A single-process run closes its cache and leaves no annotator behind."""
+        before = cli._annotator
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            cli.annotate(io.StringIO(self.text), io.StringIO(), cache=str(self.path))
+            gc.collect()
+        self.assertIs(cli._annotator, before)
+        self.assertEqual([w for w in caught if issubclass(w.category, ResourceWarning)], [])
+
+if __name__ == '__main__':
+    unittest.main()
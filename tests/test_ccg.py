@@ -1,8 +1,12 @@
 """Tests a mixture of generic, UD-specific and CCG-specific functions."""
 import csv
+from pathlib import Path
+import re
 import unittest
-from gd_tools.ccg import CCGRetagger, CCGTyper, Subcat
+from gd_tools.ccg import CCGRetagger, CCGTyper, GrammarExporter, Subcat
 from gd_tools.core import Lemmatizer_xpos
+from gd_tools.registry import Registry
+from helpers import ResourcesTestCase
 
 class TestIntegration(unittest.TestCase):
     """Checks that all the labels actually match."""
@@ -43,6 +47,44 @@ class TestCCGTyper(unittest.TestCase):
         self.assertEqual(self.typer.type("bha", "V-s", "BIPP")[1],
                          "s[dcl past cons]/pp/n")
 
+    def test_every_tag(self):
+        """The table gives what the original per-token code gave, for every tag in types.txt."""
+        def original(surface, pos, tag):
+            clausetypes = {"p":"dcl","s":"dcl","f":"dcl","r":"rel","d":"dep"}
+            clausetype = clausetypes[pos[-1]] if pos[-1] in clausetypes \
+                else "small" if pos == "Nv" else "imp"
+            tense = "pres" if "p" in pos else "past" if "s" in pos \
+                else "fut" if "f" in pos else "hab" if "h" in pos else None
+            phon = "vowel" if re.match("^[aeiouàèìòù]", surface) or surface.startswith("f") \
+                else "cons"
+            features = (clausetype if tense is None else f"{clausetype} {tense}") + f" {phon}"
+            newtag = tag + features.upper().replace(' ','')
+            ccg_type = self.typer.types[tag] % features
+            if pos.startswith("Vm") or '0' in pos:
+                newtag = newtag + "IMPERS"
+            else:
+                ccg_type = ccg_type + "/n"
+            return (newtag, ccg_type)
+        xposes = ["V-p", "V-s", "V-f", "V-h", "V-f--r", "V-s--d", "V-h1pd", "V-s0", "V-p0-d",
+                  "Vm-2s", "Vm-3", "W-p", "W-s--r", "Wp-in", "Nv"]
+        for tag, category in self.typer.types.items():
+            for pos in xposes:
+                for surface in ["bha", "aig", "fhuair", "Àrd", "", "òl"]:
+                    if "%s" in category:
+                        # once as it is built and once from the table
+                        for _ in range(2):
+                            self.assertEqual(original(surface, pos, tag),
+                                             self.typer.type(surface, pos, tag))
+                    else:
+                        with self.assertRaises(TypeError):
+                            self.typer.type(surface, pos, tag)
+            self.assertEqual((tag, category), self.typer.type("cù", "Ncsmn", tag))
+
+    def test_interned(self):
+        """Tokens of the same kind of verb share one result."""
+        self.assertIs(self.typer.type("bhuail", "V-s", "TRANS"),
+                      self.typer.type("chunnaic", "V-s", "TRANS"))
+
 class TestCCGRetagger(unittest.TestCase):
     """Not sure what this does after four years."""
     def setUp(self):
@@ -81,6 +123,19 @@ class TestCCGRetagger(unittest.TestCase):
         self.assertTrue("BIPP" in tha)
         self.assertTrue("BIPROG" in tha)
 
+    def test_cache(self):
+        """Repeated words are looked up once, and callers get lists of their own."""
+        first = self.retagger.retag("tha", "V-p")
+        first.append("X")
+        self.assertNotIn("X", self.retagger.retag("tha", "V-p"))
+        self.assertEqual(1, self.retagger.cache_info()["hits"])
+        self.assertEqual(CCGRetagger(cache_size=None).retag("tha", "V-p"), first[:-1])
+        self.assertEqual({}, CCGRetagger(cache_size=None).cache_info())
+
+    def test_sentence(self):
+        self.assertEqual(self.retagger.retag_sentence(["an", "cù", "?"], ["Tdsm", "Ncsmn", None]),
+                         [["DET"], ["N"], None])
+
 class TestSubcat(unittest.TestCase):
     """Assigns subcategories based on PPs that verbs take."""
     def setUp(self):
@@ -132,6 +187,10 @@ class TestSubcat(unittest.TestCase):
         self.assertTrue('BIPROG' in self.subcat.subcat("tòisich"))
         self.assertTrue('VGU' in self.subcat.subcat("tionndaidh"))
 
+    def test_default(self):
+        """Lemmas that are not verbs in subcat.txt get the default frames."""
+        self.assertEqual(self.subcat.subcat("cù"), ['TRANS', 'INTRANS'])
+
     def test_ambiguous_verbs(self):
         """These are ones like coimhead that take various prepositions"""
         coimhead = self.subcat.subcat("coimhead")
@@ -157,5 +216,40 @@ class TestSubcat(unittest.TestCase):
         self.assertTrue('IMPERS' in tachair)
         self.assertTrue('VAIR' in tachair)
 
+class TestGrammarExporter(ResourcesTestCase):
+    """Fragments are rebuilt only when their inputs change."""
+    def setUp(self):
+        super().setUp()
+        self.output = Path(self.folder.name) / "grammar"
+
+    def export(self):
+        return GrammarExporter(resources=Registry(self.resources, snapshot=False)).export(self.output)
+
+    def test_export(self):
+        self.assertEqual(set(self.export().values()), {"built"})
+        grammar = (self.output / "grammar.ccg").read_text(encoding="utf-8")
+        self.assertTrue(grammar.startswith("feature { phon<2>"))
+        self.assertIn("family DET { entry: n<2>/*n<2>; }\n", grammar)
+        self.assertIn("family TRANSDCLPASTCONS { entry: s[dcl past cons]/n/n; }\n", grammar)
+        self.assertNotIn("%s", grammar)
+        words = (self.output / "words.ccg").read_text(encoding="utf-8")
+        self.assertRegex(words, r"word faic: [^;]*TRANSDCLPASTVOWEL")
+        self.assertNotRegex(words, r"word faic: [^;]*CONS")
+
+    def test_incremental(self):
+        self.export()
+        self.assertEqual(set(self.export().values()), {"cached"})
+        with open(self.resources / "subcat.txt", "a", encoding="utf-8") as file:
+            file.write("3\tTRANS\nsguab\n")
+        self.assertEqual(self.export(), {"features": "cached", "rules": "cached",
+                                         "families": "cached", "words": "built"})
+        self.assertIn("word sguab:", (self.output / "grammar.ccg").read_text(encoding="utf-8"))
+
+    def test_missing_fragment(self):
+        """A fragment deleted from the output folder is rebuilt."""
+        self.export()
+        (self.output / "rules.ccg").unlink()
+        self.assertEqual(self.export()["rules"], "built")
+
 if __name__ == '__main__':
     unittest.main()
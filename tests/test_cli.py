@@ -0,0 +1,74 @@
+"""Tests the gd-tools command."""
+import contextlib
+import io
+from pathlib import Path
+import tempfile
+import unittest
+from gd_tools import cli
+from gd_tools.ccg import CCGRetagger
+
+SAMPLE = Path(__file__).parent / "resources" / "test_sentences.conllu"
+
+class TestAnnotate(unittest.TestCase):
+    """Parallel output must be byte-identical to sequential output."""
+    def test_jobs(self):
+        """Uses one-sentence chunks so that both workers get some."""
+        text = SAMPLE.read_text(encoding="utf-8") * 20
+        single, multiple = io.StringIO(), io.StringIO()
+        self.assertEqual(cli.annotate(io.StringIO(text), single, jobs=1, chunk_size=1), 200)
+        self.assertEqual(cli.annotate(io.StringIO(text), multiple, jobs=2, chunk_size=1), 200)
+        self.assertEqual(single.getvalue(), multiple.getvalue())
+
+    def test_main(self):
+        """The console entry point writes the output file."""
+        with tempfile.TemporaryDirectory() as folder:
+            out_path = Path(folder) / "out.conllu"
+            self.assertEqual(cli.main(["annotate", "--jobs", "2", str(SAMPLE), str(out_path)]), 0)
+            self.assertIn("\tbàrd\t", out_path.read_text(encoding="utf-8"))
+
+class TestLexicon(unittest.TestCase):
+    def test_annotate(self):
+        """A lexicon built from TSV overrides the lemma in every worker."""
+        with tempfile.TemporaryDirectory() as folder:
+            tsv, lex = Path(folder) / "forms.tsv", Path(folder) / "forms.lex"
+            out_path = Path(folder) / "out.conllu"
+            tsv.write_text("bhàrd\t\tbàrd-override\n", encoding="utf-8")
+            self.assertEqual(cli.main(["lexicon", str(tsv), str(lex)]), 0)
+            self.assertEqual(cli.main(["annotate", "--jobs", "2", "--lexicon", str(lex),
+                                       str(SAMPLE), str(out_path)]), 0)
+            self.assertIn("\tbàrd-override\t", out_path.read_text(encoding="utf-8"))
+
+    def test_bad_line(self):
+        """A line without three fields is reported and nothing is written."""
+        with tempfile.TemporaryDirectory() as folder:
+            tsv, lex = Path(folder) / "forms.tsv", Path(folder) / "forms.lex"
+            tsv.write_text("bhàrd\t\tbàrd\n\nbhàird\tbàrd\n", encoding="utf-8")
+            with contextlib.redirect_stderr(io.StringIO()) as err:
+                self.assertEqual(cli.main(["lexicon", str(tsv), str(lex)]), 1)
+            self.assertIn("line 3", err.getvalue())
+            self.assertFalse(lex.exists())
+
+class TestSplit(unittest.TestCase):
+    def test_split(self):
+        """--split gives the same output with one job and with two."""
+        text = "1\tbhon\t_\tADP\tSpa-s\t_\t2\tcase\t_\t_\n2\tbhaile\t_\tNOUN\tNcsmd\t_\t0\troot\t_\t_\n\n" * 4
+        single, multiple = io.StringIO(), io.StringIO()
+        self.assertEqual(cli.annotate(io.StringIO(text), single, split=True), 12)
+        self.assertEqual(cli.annotate(io.StringIO(text), multiple, jobs=2, chunk_size=1,
+                                      split=True), 12)
+        self.assertEqual(single.getvalue(), multiple.getvalue())
+        self.assertIn("1-2\tbhon\t", single.getvalue())
+        self.assertIn("2\tan\tan\tDET\tTds\t", single.getvalue())
+
+class TestSupertags(unittest.TestCase):
+    def test_supertags(self):
+        out = io.StringIO()
+        with open(SAMPLE, encoding="utf-8") as infile:
+            self.assertEqual(cli.supertags(infile, out, CCGRetagger()), 10)
+        lines = out.getvalue().split("\n")
+        self.assertEqual(lines[0], "Bha\tV-s\tBIPROG BIPP")
+        self.assertEqual(lines[1], "an\tTdsm\tDET")
+        self.assertEqual(lines[7], "")
+
+if __name__ == '__main__':
+    unittest.main()
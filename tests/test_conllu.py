@@ -0,0 +1,129 @@
+"""Tests streaming CoNLL-U annotation."""
+import itertools
+from pathlib import Path
+import tempfile
+import unittest
+from gd_tools.conllu import Annotator, Splitter, format_feats, parse_feats, read_sentences, write_sentence
+
+SAMPLE = Path(__file__).parent / "resources" / "test_sentences.conllu"
+
+class TestConllu(unittest.TestCase):
+    """Reads, annotates and writes a sentence at a time."""
+    def setUp(self):
+        self.annotator = Annotator()
+
+    def tearDown(self):
+        self.annotator = None
+
+    def test_round_trip(self):
+        """Reading and writing without annotating changes nothing."""
+        with open(SAMPLE, encoding="utf-8") as file:
+            text = file.read()
+        self.assertEqual("".join(write_sentence(s) for s in read_sentences(text.splitlines(True))),
+                         text)
+
+    def test_feats(self):
+        """FEATS strings are sorted case-insensitively."""
+        feats = parse_feats("Typo=Yes|Case=Gen")
+        self.assertEqual(feats, {"Typo": ["Yes"], "Case": ["Gen"]})
+        self.assertEqual(format_feats(feats), "Case=Gen|Typo=Yes")
+        self.assertEqual(format_feats({}), "_")
+
+    def test_annotate(self):
+        """Comments and ranges pass through; words get LEMMA and FEATS."""
+        with open(SAMPLE, encoding="utf-8") as file:
+            sentences = [line.split("\n") for line in "".join(self.annotator.annotate(file)).split("\n\n")]
+        self.assertEqual(sentences[0][0], "# sent_id = test_1")
+        self.assertEqual(sentences[0][5], "4-5\tsa\t_\t_\t_\t_\t_\t_\t_\t_")
+        self.assertEqual(sentences[0][2].split("\t")[2:6], ["bi", "AUX", "V-s", "Tense=Past"])
+        self.assertEqual(sentences[0][8].split("\t")[2], "baile")
+        self.assertEqual(sentences[1][2].split("\t")[5], "VerbForm=Vnoun")
+        self.assertEqual(sentences[1][3].split("\t")[5], "Case=Gen|Gender=Masc|Number=Sing|Typo=Yes")
+
+    def test_previous_xpos(self):
+        """A verbal noun after the infinitive particle is an infinitive."""
+        sentence = [["1", "a", "_", "PART", "Ug", "_", "_", "_", "_", "_"],
+                    ["2", "dhèanamh", "_", "NOUN", "Nv", "_", "_", "_", "_", "_"]]
+        self.assertEqual(self.annotator.annotate_sentence(sentence)[1][5], "VerbForm=Inf")
+
+    def test_streaming(self):
+        """Output starts before the input ends."""
+        with open(SAMPLE, encoding="utf-8") as file:
+            lines = file.readlines()
+        endless = itertools.cycle(lines)
+        first = list(itertools.islice(self.annotator.annotate(endless), 3))
+        self.assertEqual(len(first), 3)
+
+    def test_annotate_file(self):
+        """Counts the words it annotates."""
+        with tempfile.TemporaryDirectory() as folder:
+            out_path = Path(folder) / "out.conllu"
+            self.assertEqual(self.annotator.annotate_file(SAMPLE, out_path), 10)
+            self.assertIn("\tbàrd\t", out_path.read_text(encoding="utf-8"))
+
+class TestSplitter(unittest.TestCase):
+    """Fused tokens become multiword ranges and everything is renumbered."""
+    def setUp(self):
+        self.splitter = Splitter()
+
+    def tearDown(self):
+        self.splitter = None
+
+    def test_split(self):
+        sentence = read_sentences([
+            "# text = Thàinig e bhon bhaile\n",
+            "1\tThàinig\t_\tVERB\tV-s\t_\t0\troot\t0:root\t_\n",
+            "2\te\t_\tPRON\tPp3sm\t_\t1\tnsubj\t1:nsubj\t_\n",
+            "3\tbhon\t_\tADP\tSpa-s\t_\t4\tcase\t4:case\t_\n",
+            "4\tbhaile\t_\tNOUN\tNcsmd\t_\t1\tobl\t1:obl\tSpaceAfter=No\n"])
+        result = self.splitter.split_sentence(next(sentence))
+        self.assertEqual(result[0], "# text = Thàinig e bhon bhaile")
+        self.assertEqual(result[3], ["3-4", "bhon", "_", "_", "_", "_", "_", "_", "_", "_"])
+        self.assertEqual(result[4], ["3", "bho", "_", "ADP", "Sp", "_", "5", "case", "5:case", "_"])
+        self.assertEqual(result[5], ["4", "an", "_", "DET", "Tds", "_", "5", "det", "5:det", "_"])
+        self.assertEqual(result[6][0], "5")
+        self.assertEqual(result[6][6:], ["1", "obl", "1:obl", "SpaceAfter=No"])
+
+    def test_enhanced(self):
+        """Both parts get DEPS when the sentence has enhanced dependencies, and neither when not."""
+        sentence = next(read_sentences([
+            "1\tThàinig\t_\tVERB\tV-s\t_\t0\troot\t0:root\t_\n",
+            "2\tDen\t_\tADP\tSpa-s\t_\t3\tcase\t3:case\t_\n",
+            "3\tbhaile\t_\tNOUN\tNcsmd\t_\t1\tobl\t1:obl\t_\n"]))
+        result = self.splitter.split_sentence(sentence)
+        self.assertEqual([line[8] for line in result], ["0:root", "_", "4:case", "4:det", "1:obl"])
+        self.assertTrue(all(line[8] != "_" for line in result if "-" not in line[0]))
+        plain = [line[:8] + ["_", "_"] for line in sentence]
+        self.assertEqual([line[8] for line in self.splitter.split_sentence(plain)], ["_"] * 5)
+
+    def test_unchanged(self):
+        """Existing ranges are kept; a sentence with nothing to split comes back as is."""
+        with open(SAMPLE, encoding="utf-8") as file:
+            sentences = list(read_sentences(file))
+        for sentence in sentences:
+            self.assertIs(self.splitter.split_sentence(sentence), sentence)
+
+    def test_capitals(self):
+        """The first part keeps the capital; the XPOS decides which table row applies."""
+        sentence = [["1", "Sa", "_", "ADP", "Spa-s", "_", "_", "_", "_", "_"],
+                    ["2", "sa", "_", "ADP", "Spv", "_", "_", "_", "_", "_"],
+                    ["2.1", "bha", "_", "VERB", "V-s", "_", "_", "_", "2:dep", "_"]]
+        result = self.splitter.split_sentence(sentence)
+        self.assertEqual([line[0:5] for line in result[1:3]],
+                         [["1", "Anns", "_", "ADP", "Sp"], ["2", "an", "_", "ADP", "Sp"]])
+        self.assertEqual(result[5][1:5], ["a", "_", "PART", "Q-r"])
+        self.assertEqual(result[5][6:8], ["_", "_"])
+        self.assertEqual(result[6][0], "4.1")
+        self.assertEqual(result[6][8], "3:dep")
+
+    def test_annotate(self):
+        """The parts are lemmatized and featurised, and the range is not."""
+        annotator = Annotator(splitter=self.splitter)
+        sentence = [["1", "chun", "_", "ADP", "Spa-s", "_", "_", "_", "_", "_"],
+                    ["2", "taighe", "_", "NOUN", "Ncsmg", "_", "_", "_", "_", "_"]]
+        result = annotator.annotate_sentence(sentence)
+        self.assertEqual([line[2] for line in result], ["_", "gu", "an", "taigh"])
+        self.assertEqual(result[2][5], "Definite=Def|Number=Sing|PronType=Art")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -41,6 +41,17 @@ class TestNormalise(unittest.TestCase):
         self.assertEqual("b' i", self.goc.normalise_spacing("b'i"))
         self.assertEqual("da", self.goc.normalise_spacing("d'a"))
 
+    def test_text(self):
+        """Running text, including curly apostrophes and punctuation."""
+        lines = ["B’e so an tigh ard aig a’ bhaile,\n", "agus bha e maith.\n"]
+        self.assertEqual(list(self.goc.normalise_text(lines)),
+                         ["B' e seo an taigh àrd aig a' bhaile,\n", "agus bha e math.\n"])
+
+    def test_word_cache(self):
+        """Repeated words come from the cache."""
+        list(self.goc.normalise_text(["so so so"]))
+        self.assertEqual(self.goc.cache.info()["hits"], 2)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,70 @@
+"""Tests the lexicon-change impact index."""
+import io
+from pathlib import Path
+import unittest
+from gd_tools import cli
+from gd_tools.conllu import read_sentences
+from gd_tools.core import Lemmatizer_xpos
+from gd_tools.impact import ImpactIndex
+from gd_tools.registry import Registry
+from helpers import ResourcesTestCase
+
+SAMPLE = Path(__file__).parent / "resources" / "test_sentences.conllu"
+
+class TestImpactIndex(ResourcesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.index = ImpactIndex()
+        with open(SAMPLE, encoding="utf-8") as file:
+            self.assertEqual(self.index.add(read_sentences(file)), 10)
+
+    def edit(self, filename: str, line: str) -> Registry:
+        with open(self.resources / filename, "a", encoding="utf-8") as file:
+            file.write(line)
+        return Registry(self.resources, snapshot=False)
+
+    def test_lookups(self):
+        """Lookups are recorded whether or not the key is in the table."""
+        lookups = self.index.lookups[("bhàrd", "Ncsmg")]
+        self.assertIn(("lemmata", "bàrd"), lookups)
+        self.assertIsNone(self.index.found["lemmata"]["bàrd"])
+        self.assertIn(("verbal_nouns", "bruidhinn"), self.index.lookups[("bruidhinn", "Nv")])
+        self.assertEqual(self.index.positions[("an", "Tdsm")], [("test_1", "2"), ("test_1", "5")])
+
+    def test_unrelated(self):
+        """An entry no word looked up changes nothing."""
+        resources = self.edit("lemmata.csv", "sgrìobhaichean,sgrìobhadair\n")
+        self.assertEqual(self.index.changed(resources), [])
+        self.assertEqual(self.index.update(resources), [])
+
+    def test_update(self):
+        """Only the words which looked up the new entry are lemmatized again."""
+        resources = self.edit("lemmata.csv", "bàrd,bàrd-edited\n")
+        self.assertEqual(self.index.changed(resources), [("lemmata", "bàrd")])
+        self.assertEqual(self.index.affected(resources), {("bhàrd", "Ncsmg")})
+        self.assertEqual(self.index.update(resources),
+                         [("test_2", "3", "bhàrd", "Ncsmg", "bàrd", "bàrd-edited")])
+        lemmatizer = Lemmatizer_xpos(resources=resources)
+        for (form, xpos), lemma in self.index.lemmas.items():
+            self.assertEqual(lemma, lemmatizer.lemmatize(form, xpos))
+        self.assertEqual(self.index.changed(resources), [])
+
+    def test_save(self):
+        path = Path(self.folder.name) / "sample.impact"
+        self.index.save(path)
+        loaded = ImpactIndex.load(path)
+        self.assertEqual(loaded.lemmas, self.index.lemmas)
+        self.assertEqual(loaded.positions, self.index.positions)
+        resources = self.edit("verbal_nouns.csv", "bruidhinn-edited,bruidhinn\n")
+        self.assertEqual(self.index.update(resources), loaded.update(resources))
+
+    def test_cli(self):
+        path = Path(self.folder.name) / "sample.impact"
+        self.assertEqual(cli.main(["impact", str(SAMPLE), str(path)]), 0)
+        out = io.StringIO()
+        resources = self.edit("lemmata.csv", "bàrd,bàrd-edited\n")
+        self.assertEqual(cli.impact_diff(ImpactIndex.load(path), resources, out), 1)
+        self.assertEqual(out.getvalue(), "test_2\t3\tbhàrd\tNcsmg\tbàrd\tbàrd-edited\n")
+
+if __name__ == '__main__':
+    unittest.main()
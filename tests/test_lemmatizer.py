@@ -3,10 +3,13 @@ Tests the lemmatizer used in the Universal Dependencies Scottish Gaelic treebank
 
 Currently this requires a part-of-speech tag.
 """
+from concurrent.futures import ThreadPoolExecutor
 import csv
 from pathlib import Path
 import unittest
-from gd_tools.core import Lemmatizer_xpos
+from gd_tools.core import Core, GOC, Lemmatizer, Lemmatizer_xpos, SuffixRules
+from gd_tools.lexicon import DictLexicon
+from gd_tools.registry import Registry
 
 class TestLemmatizer(unittest.TestCase):
     """
@@ -233,5 +236,251 @@ class TestLemmatizer(unittest.TestCase):
         """
         self.from_file("resources/test_verbs.csv")
 
+class TestDispatch(unittest.TestCase):
+    """
+    The branch for each XPOS is worked out once.
+    """
+    def test_handlers(self):
+        """One handler per distinct tag, reused for later tokens."""
+        lemmatizer = Lemmatizer_xpos(index=False)
+        self.assertEqual(lemmatizer.lemmatize("Bhig", "Aq-smg"), "beag")
+        handler = lemmatizer.handlers["Aq-smg"]
+        self.assertEqual(lemmatizer.lemmatize("Dheirg", "Aq-sfg"), "dearg")
+        self.assertEqual(lemmatizer.lemmatize("mhòir", "Aq-smg"), "mòr")
+        self.assertIs(lemmatizer.handlers["Aq-smg"], handler)
+        self.assertEqual(sorted(lemmatizer.handlers), ["Aq-sfg", "Aq-smg"])
+
+    def test_cased(self):
+        """Proper nouns keep their capitals, adverbs do not."""
+        lemmatizer = Lemmatizer_xpos()
+        self.assertEqual(lemmatizer.lemmatize("h-Alba", "Nt"), "Alba")
+        self.assertEqual(lemmatizer.lemmatize("Thall", "Rs"), "thall")
+        self.assertEqual(lemmatizer.lemmatize("Sheo", "Rs"), "seo")
+
+class TestMutationIndex(unittest.TestCase):
+    """
+    Known words in any mutated form are answered by the index, as the rules would answer them.
+    """
+    def setUp(self):
+        self.lemmatizer = Lemmatizer_xpos()
+        self.cascade = Lemmatizer_xpos(index=False)
+
+    def tearDown(self):
+        self.lemmatizer = None
+        self.cascade = None
+
+    def test_variants(self):
+        stats = self.lemmatizer.instrument()
+        self.assertEqual(self.lemmatizer.lemmatize("bhràithrean", "Ncpmn"), "bràthair")
+        self.assertEqual(self.lemmatizer.lemmatize("Bhig", "Aq-sfg"), "beag")
+        self.assertEqual(self.lemmatizer.lemmatize("t-Bhig", "Aq-smg"), "beag")
+        self.assertEqual(self.lemmatizer.lemmatize("dh’bhualadh", "Nv"), "buail")
+        self.assertEqual(stats.snapshot()["branches"]["mutation_index"], 4)
+        self.assertNotIn("Aq-smg", self.lemmatizer.handlers)
+
+    def test_agrees(self):
+        """Every entry in every family's index is what the cascade gives."""
+        xposes = {"noun": ["Ncsmn", "Ncpfg", "Ncsmd*"], "vn": ["Nv"],
+                  "adjective": ["Aq-smn", "Aq-pfg", "Av", "Ar"]}
+        for family, family_xposes in xposes.items():
+            table = self.lemmatizer.build_index(family)
+            self.assertGreater(len(table), 1000)
+            for xpos in family_xposes:
+                self.assertIs(self.lemmatizer.index_table(xpos),
+                              self.lemmatizer.index_table(family_xposes[0]))
+                for form, lemma in table.items():
+                    self.assertEqual(lemma, self.cascade.lemmatize(form, xpos), (form, xpos))
+
+    def test_shared(self):
+        """Lemmatizers on the same Registry share one index per family."""
+        other = Lemmatizer_xpos()
+        self.assertIs(other.index_table("Ncsfg"), self.lemmatizer.index_table("Ncsmn"))
+        self.assertIsNot(Lemmatizer_xpos(resources=Registry()).index_table("Ncsmn"),
+                         self.lemmatizer.index_table("Ncsmn"))
+
+    def test_not_indexed(self):
+        """Proper nouns, emphatic nouns and comparatives keep to the cascade."""
+        for xpos in ["Nn-mn", "Nt", "Ncsmne", "Apc", "V-s", "Sa"]:
+            self.assertEqual(self.lemmatizer.index_table(xpos), {})
+        self.assertFalse(Lemmatizer_xpos(lexicon=DictLexicon([])).index)
+
+class TestReadings(unittest.TestCase):
+    """Untagged surfaces get one reading per distinct lemma in each XPOS family."""
+    def setUp(self):
+        self.lemmatizer = Lemmatizer_xpos()
+
+    def tearDown(self):
+        self.lemmatizer = None
+
+    def test_readings(self):
+        readings = self.lemmatizer.lemmatize_readings("chunnaic")
+        self.assertIn(("V", "faic"), readings)
+        self.assertIn(("Nc", "cunnaic"), readings)
+        self.assertEqual(readings, tuple(sorted(set(readings))))
+        self.assertIn(("Nv", "falbh"), self.lemmatizer.lemmatize_readings("dh’fhalbh"))
+
+    def test_agrees(self):
+        """Each reading is what lemmatize gives with one of the family's tags."""
+        for surface in ["bhuail", "Bhig", "h-uile", "thuirt", "bhràithrean", "dhomh"]:
+            expected = {(family, self.lemmatizer.lemmatize(surface, xpos))
+                        for family, xposes in Lemmatizer_xpos.reading_xposes.items()
+                        for xpos in xposes}
+            self.assertEqual(set(self.lemmatizer.lemmatize_readings(surface)), expected)
+
+    def test_cache(self):
+        first = self.lemmatizer.lemmatize_readings("bhuail")
+        self.assertIs(first, self.lemmatizer.lemmatize_readings("bhuail"))
+        self.assertEqual(self.lemmatizer.readings_cache.info()["hits"], 1)
+        self.lemmatizer.cache_clear()
+        self.assertEqual(self.lemmatizer.readings_cache.info()["size"], 0)
+
+    def test_lexicon(self):
+        lemmatizer = Lemmatizer_xpos(lexicon=DictLexicon([("bhuail", "V-s", "buail-override")]))
+        self.assertIn(("V", "buail-override"), lemmatizer.lemmatize_readings("bhuail"))
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Counts branches and times XPOS families only when asked to.
+    """
+    def test_snapshot(self):
+        """Lexicon hits, verbal nouns and rules are told apart."""
+        lemmatizer = Lemmatizer_xpos(index=False)
+        self.assertIsNone(lemmatizer.stats)
+        stats = lemmatizer.instrument()
+        self.assertEqual(lemmatizer.lemmatize("bhràithrean", "Ncpmn"), "bràthair")
+        self.assertEqual(lemmatizer.lemmatize("bualadh", "Nv"), "buail")
+        self.assertEqual(lemmatizer.lemmatize("bhalaich", "Ncsmg"), "balach")
+        self.assertEqual(lemmatizer.lemmatize("bhuail", "V-s"), "buail")
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot["branches"]["noun_lexicon"], 1)
+        self.assertEqual(snapshot["branches"]["noun_rule"], 1)
+        self.assertEqual(snapshot["branches"]["vn_lexicon"], 1)
+        self.assertEqual(snapshot["branches"]["verb_unchanged"], 1)
+        self.assertEqual(snapshot["families"]["Nc"]["tokens"], 2)
+        self.assertGreater(snapshot["families"]["Nc"]["seconds"], 0)
+        stats.reset()
+        self.assertEqual(stats.snapshot(), {"branches": {}, "families": {}})
+
+    def test_off(self):
+        """Switching off stops the counting."""
+        lemmatizer = Lemmatizer_xpos()
+        stats = lemmatizer.instrument()
+        self.assertIsNone(lemmatizer.instrument(False))
+        lemmatizer.lemmatize("bhuail", "V-s")
+        self.assertEqual(stats.snapshot(), {"branches": {}, "families": {}})
+
+class TestLemmatizerCache(unittest.TestCase):
+    """
+    The optional LRU cache must not change any lemmata.
+    """
+    def setUp(self):
+        self.lemmatizer = Lemmatizer_xpos()
+        self.cached = Lemmatizer_xpos(cache_size=64)
+
+    def tearDown(self):
+        self.lemmatizer = None
+        self.cached = None
+
+    def test_same_output(self):
+        """Runs the noun and verb files through twice to exercise both hits and misses."""
+        for filename in ["resources/test_nouns.csv", "resources/test_verbs.csv"] * 2:
+            with open(Path(__file__).parent / filename, encoding="utf-8") as file:
+                reader = csv.reader(file)
+                next(reader)
+                for line in reader:
+                    self.assertEqual(self.cached.lemmatize(line[0], line[1]),
+                                     self.lemmatizer.lemmatize(line[0], line[1]))
+
+    def test_counters(self):
+        """Hits, misses and evictions are counted per method."""
+        self.assertEqual(Lemmatizer_xpos().cache_info(), {})
+        self.cached.lemmatize("bhuail", "V-s")
+        self.cached.lemmatize("bhuail", "V-s")
+        info = self.cached.cache_info()
+        self.assertEqual(info["lemmatize"]["hits"], 1)
+        self.assertEqual(info["lemmatize"]["misses"], 1)
+        self.assertEqual(info["lemmatize_verb"]["misses"], 1)
+        self.cached.lemmatize("leam", "Spp1s")
+        self.assertEqual(self.cached.cache_info()["lemmatize_preposition"]["misses"], 1)
+        self.cached.cache_clear()
+        self.assertEqual(self.cached.cache_info()["lemmatize"]["size"], 0)
+
+    def test_keywords(self):
+        """Switching the cache on does not change which calls are valid."""
+        self.assertEqual(self.cached.lemmatize(surface="bhuail", xpos="V-s"), "buail")
+        self.assertEqual(self.cached.lemmatize("bhuail", xpos="V-s"), "buail")
+        self.assertEqual(self.cached.cache_info()["lemmatize"]["hits"], 1)
+
+    def test_surface_only(self):
+        """The surface-only lemmatizer can be cached and reset on its own."""
+        lemmatizer = Lemmatizer(cache_size=4)
+        lemmatizer.lemmatize_preposition("leam")
+        lemmatizer.lemmatize_preposition("leam")
+        self.assertEqual(lemmatizer.cache_info()["lemmatize_preposition"]["hits"], 1)
+        lemmatizer.cache_clear()
+        self.assertEqual(lemmatizer.cache_info()["lemmatize_preposition"]["hits"], 0)
+        with self.assertRaises(ValueError):
+            Lemmatizer(cache_size=-1)
+
+    def test_eviction(self):
+        """The least recently used entry goes first."""
+        small = Lemmatizer_xpos(cache_size=2)
+        small.lemmatize("bhuail", "V-s")
+        small.lemmatize("chunnaic", "V-s")
+        small.lemmatize("bhuail", "V-s")
+        small.lemmatize("thàinig", "V-s")
+        info = small.cache_info()["lemmatize"]
+        self.assertEqual(info["evictions"], 1)
+        self.assertEqual(info["size"], 2)
+        small.lemmatize("bhuail", "V-s")
+        self.assertEqual(small.cache_info()["lemmatize"]["hits"], 2)
+
+class TestThreads(unittest.TestCase):
+    """One lemmatizer shared between threads gives what a lemmatizer of its own would."""
+    def test_shared(self):
+        with open(Path(__file__).parent / "resources/test_nouns.csv", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            next(reader)
+            pairs = [(line[0], line[1]) for line in reader] * 4
+        own = Lemmatizer_xpos()
+        expected = [own.lemmatize(*pair) for pair in pairs]
+        shared = Lemmatizer_xpos(cache_size=16)
+        stats = shared.instrument()
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda pair: shared.lemmatize(*pair), pairs))
+        self.assertEqual(results, expected)
+        info = shared.cache_info()["lemmatize"]
+        self.assertEqual(info["hits"] + info["misses"], len(pairs))
+        self.assertLessEqual(info["size"], 16)
+        self.assertEqual(sum(family["tokens"] for family in stats.snapshot()["families"].values()),
+                         info["misses"] - stats.snapshot()["branches"].get("mutation_index", 0))
+
+class TestSuffixRules(unittest.TestCase):
+    """
+    The compiled tables must behave exactly like the dictionaries they replace.
+    """
+    def test_first_match_wins(self):
+        """Order in the table matters, not length of the ending."""
+        replacements = {"an": "", "ean": "X", "bean": "Y"}
+        rules = SuffixRules(replacements)
+        for word in ["bean", "clachan", "sgian", "cat", "an", ""]:
+            self.assertEqual(rules.apply(word), Core.replace_ending(replacements, word))
+        self.assertEqual(rules.apply("bean"), "be")
+        self.assertEqual(SuffixRules({"ean": "X", "an": ""}).apply("bean"), "bX")
+
+    def test_lemmatizer_tables(self):
+        """Checks every compiled table on every noun and verb in the test files."""
+        words = []
+        for filename in ["resources/test_nouns.csv", "resources/test_verbs.csv",
+                         "resources/test_verbal_nouns.csv"]:
+            with open(Path(__file__).parent / filename, encoding="utf-8") as file:
+                words += [line[0] for line in csv.reader(file)]
+        for rules in [Lemmatizer_xpos.plural_rules, Lemmatizer_xpos.f_rules,
+                      Lemmatizer_xpos.m_rules, Lemmatizer_xpos.relative_rules,
+                      Lemmatizer_xpos.vn_rules, GOC.schwa_rules]:
+            for word in words:
+                self.assertEqual(Core.replace_ending(rules, word),
+                                 Core.replace_ending(rules.replacements, word))
+
 if __name__ == '__main__':
     unittest.main()
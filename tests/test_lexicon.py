@@ -0,0 +1,96 @@
+"""Tests the full-form lexicon backends."""
+from pathlib import Path
+import tempfile
+import unittest
+from gd_tools.core import Lemmatizer, Lemmatizer_xpos
+from gd_tools.lexicon import DictLexicon, Lexicon, MmapLexicon
+
+ENTRIES = [
+    ("bhàird", "Ncpmn", "bàrd"),
+    ("bhàird", "Ncsmg", "bàrd"),
+    ("chunnaic", "", "faic"),
+    ("chunnaic", "V-s", "faic"),
+    ("mhòr", "", "mòr"),
+    ("mhòr", "", "mòrachd"),
+    ("òrain", "Ncpmn", "òran"),
+]
+
+class TestMmapLexicon(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / "forms.lex"
+        self.assertEqual(MmapLexicon.build(ENTRIES, self.path), 6)
+        self.lexicon = MmapLexicon(self.path)
+
+    def tearDown(self):
+        self.lexicon.close()
+        self.folder.cleanup()
+
+    def test_lookup(self):
+        self.assertEqual("bàrd", self.lexicon.lookup("bhàird", "Ncsmg"))
+        self.assertEqual("òran", self.lexicon.lookup("òrain", "Ncpmn"))
+        self.assertEqual("faic", self.lexicon.lookup("chunnaic"))
+        self.assertEqual("faic", self.lexicon.lookup("chunnaic", "V-f"))
+
+    def test_missing(self):
+        self.assertIsNone(self.lexicon.lookup("bhàird"))
+        self.assertIsNone(self.lexicon.lookup("bhàird", "Nt"))
+        self.assertIsNone(self.lexicon.lookup("aaa"))
+        self.assertIsNone(self.lexicon.lookup("ùr"))
+
+    def test_first_wins(self):
+        self.assertEqual("mòr", self.lexicon.lookup("mhòr"))
+
+    def test_header(self):
+        bad = Path(self.folder.name) / "bad.lex"
+        bad.write_text("bhàird\tNcsmg\tbàrd\n", encoding="utf-8")
+        with self.assertRaises(ValueError):
+            MmapLexicon(bad)
+
+    def test_tab(self):
+        with self.assertRaises(ValueError):
+            MmapLexicon.build([("a\tb", "", "a")], Path(self.folder.name) / "tab.lex")
+
+    def test_dict_lexicon(self):
+        """Both backends agree on a larger table, including on forms that are absent."""
+        entries = [(f"f{n * 7 % 1000}", "Nc" if n % 3 else "", f"l{n}") for n in range(2000)]
+        path = Path(self.folder.name) / "large.lex"
+        MmapLexicon.build(entries, path)
+        lexicon, expected = MmapLexicon(path), DictLexicon(entries)
+        try:
+            for n in range(1100):
+                for xpos in (None, "Nc", "V-s"):
+                    self.assertEqual(expected.lookup(f"f{n}", xpos), lexicon.lookup(f"f{n}", xpos))
+        finally:
+            lexicon.close()
+
+    def test_abstract(self):
+        """Backends must implement lookup."""
+        with self.assertRaises(TypeError):
+            Lexicon()
+        self.assertIsInstance(DictLexicon([]), Lexicon)
+
+class TestLemmatizerLexicon(unittest.TestCase):
+    """The lexicon overrides the rules; without it nothing changes."""
+    def test_xpos(self):
+        lexicon = DictLexicon([("cait", "Ncpmn", "cat-override"), ("mhòr", "", "mòr-override")])
+        lemmatizer = Lemmatizer_xpos(lexicon=lexicon)
+        self.assertEqual("cat-override", lemmatizer.lemmatize("cait", "Ncpmn"))
+        self.assertEqual("cat-override", lemmatizer.lemmatize("Cait", "Ncpmn"))
+        self.assertEqual("mòr-override", lemmatizer.lemmatize("mhòr", "Aq-smn"))
+        self.assertEqual("cat", lemmatizer.lemmatize("cait", "Ncpmg"))
+        self.assertEqual("cat", Lemmatizer_xpos().lemmatize("cait", "Ncpmn"))
+
+    def test_counted(self):
+        lemmatizer = Lemmatizer_xpos(lexicon=DictLexicon([("cait", "", "cat")]))
+        lemmatizer.instrument()
+        lemmatizer.lemmatize("cait", "Ncpmn")
+        self.assertEqual(1, lemmatizer.stats.snapshot()["branches"]["external_lexicon"])
+
+    def test_lemmatizer(self):
+        lemmatizer = Lemmatizer(lexicon=DictLexicon([("leis", "", "le-override")]))
+        self.assertEqual("le-override", lemmatizer.lemmatize_preposition("leis"))
+        self.assertEqual("le", Lemmatizer().lemmatize_preposition("leis"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Tests the paradigm generator."""
+import unittest
+from gd_tools.core import Lemmatizer_xpos
+from gd_tools.lexicon import DictLexicon
+from gd_tools.paradigm import ParadigmGenerator
+
+class TestParadigmGenerator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.generator = ParadigmGenerator()
+        cls.entries = list(cls.generator.entries())
+
+    def test_checked(self):
+        """Every entry lemmatizes back to its lemma."""
+        lemmatizer = Lemmatizer_xpos()
+        for surface, xpos, lemma in self.entries:
+            self.assertEqual(lemmatizer.lemmatize(surface, xpos or None), lemma)
+
+    def test_predict_verb(self):
+        forms = {xpos: surface for surface, xpos in self.generator.predict_verb("òl")}
+        self.assertEqual(forms["V-s"], "dh'òl")
+        self.assertEqual(forms["V-f"], "òlaidh")
+        forms = {xpos: surface for surface, xpos in self.generator.predict_verb("fosgail")}
+        self.assertEqual(forms["V-s"], "dh'fhosgail")
+
+    def test_forms(self):
+        forms = self.generator.forms("buail")
+        self.assertIn(("bhuail", "V-s"), forms)
+        self.assertIn(("buailidh", "V-f"), forms)
+        self.assertIn(("bualadh", "Nv"), forms)
+        self.assertEqual(self.generator.forms("xyzzy"), [])
+
+    def test_rejected(self):
+        """Predictions the lemmatizer does not confirm are left out."""
+        self.assertGreater(self.generator.rejected, 0)
+        table = self.generator.table()
+        self.assertEqual(len(table), len(self.entries))
+        self.assertIn(("bheir", "V-s", "beir"), self.generator.predict())
+        self.assertNotIn(("bheir", "V-s"), table)
+
+    def test_lexicon(self):
+        lexicon = DictLexicon(self.entries)
+        self.assertEqual(lexicon.lookup("bhuail", "V-s"), "buail")
+        self.assertEqual(lexicon.lookup("beaga"), "beag")
+
+if __name__ == '__main__':
+    unittest.main()
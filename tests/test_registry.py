@@ -0,0 +1,122 @@
+"""Tests the shared resource registry."""
+import os
+from pathlib import Path
+import unittest
+from unittest import mock
+from gd_tools.ccg import CCGRetagger, CCGTyper
+from gd_tools.core import Lemmatizer_xpos
+from gd_tools.registry import SNAPSHOT_ENV, Registry
+from helpers import ResourcesTestCase
+
+class TestRegistry(unittest.TestCase):
+    """Each file is parsed once and the tables are shared."""
+    def test_shared(self):
+        """The retagger, its subcategoriser and a separate lemmatizer use the same tables."""
+        retagger = CCGRetagger()
+        lemmatizer = Lemmatizer_xpos()
+        self.assertIs(lemmatizer.lemmata, lemmatizer.lemmatizer.lemmata)
+        self.assertIs(lemmatizer.lemmata, retagger.sub.lemmatizer.lemmata)
+        self.assertIs(lemmatizer.vns, retagger.sub.lemmatizer.vns)
+        self.assertIs(CCGTyper().types, CCGTyper().types)
+
+    def test_sharing_instances(self):
+        """Annotators can be handed the ones they depend on."""
+        retagger = CCGRetagger()
+        self.assertIs(CCGRetagger(sub=retagger.sub).sub.lemmatizer, retagger.sub.lemmatizer)
+
+    def test_read_only(self):
+        """The tables cannot be modified in place."""
+        with self.assertRaises(TypeError):
+            Registry.shared().lemmata()["bhig"] = "beag"
+
+    def test_frames_not_shared(self):
+        """Changing one retagger's answer does not leak into another's."""
+        CCGRetagger().retag("bhuail", "V-s").append("X")
+        self.assertNotIn("X", CCGRetagger().retag("bhuail", "V-s"))
+
+    def test_report(self):
+        """Loads happen on first use and are costed."""
+        registry = Registry()
+        self.assertEqual(registry.report(), {})
+        registry.verbal_nouns()
+        self.assertEqual(list(registry.report()), ["verbal_nouns"])
+        registry.load_all()
+        report = registry.report()
+        self.assertEqual(sorted(report), sorted(Registry.names()))
+        for cost in report.values():
+            self.assertGreaterEqual(cost["ms"], 0)
+            self.assertGreater(cost["bytes"], 0)
+
+    def test_splits(self):
+        """splits.csv is indexed on the lower-cased form and the XPOS."""
+        splits = Registry.shared().splits()
+        self.assertEqual(splits[("bhon", "Spa-s")], (("bho", "ADP", "Sp"), ("an", "DET", "Tds")))
+        self.assertEqual(splits[("bhon", "Spv")], (("bho", "ADP", "Sp"), ("an", "PART", "Qq")))
+        self.assertNotIn(("form", "xpos"), splits)
+
+    def test_separate_registry(self):
+        """A registry of its own gives a lemmatizer its own tables."""
+        registry = Registry()
+        self.assertIsNot(Lemmatizer_xpos(resources=registry).lemmata, Lemmatizer_xpos().lemmata)
+        self.assertEqual(Lemmatizer_xpos(resources=registry).lemmatize("bhàrd", "Ncsmd"), "bàrd")
+
+class TestSnapshot(ResourcesTestCase):
+    """Parsed tables can be reloaded from a snapshot while their sources are unchanged."""
+    def setUp(self):
+        super().setUp()
+        Registry(self.resources).write_snapshot()
+
+    def test_same_tables(self):
+        """Everything comes from the snapshot and matches what parsing gives."""
+        snapshot = Registry(self.resources)
+        parsed = Registry(self.resources, snapshot=False)
+        snapshot.load_all()
+        self.assertTrue(all(cost.get("snapshot") for cost in snapshot.report().values()))
+        for name in ["lemmata", "verbal_nouns", "prepositions", "retaggings", "subcat", "types"]:
+            self.assertEqual(dict(snapshot.get(name)), dict(parsed.get(name)))
+        self.assertEqual(snapshot.preposition_matcher()[0].pattern,
+                         parsed.preposition_matcher()[0].pattern)
+        self.assertEqual(Lemmatizer_xpos(resources=snapshot).lemmatize("leam", "Spp1s"), "le")
+
+    def test_changed_source(self):
+        """Only the tables from an edited file are parsed again."""
+        with open(self.resources / "lemmata.csv", "a", encoding="utf-8") as file:
+            file.write("bhig,beag\n")
+        registry = Registry(self.resources)
+        self.assertEqual(registry.lemmata()["bhig"], "beag")
+        self.assertNotIn("snapshot", registry.report()["lemmata"])
+        registry.types()
+        self.assertTrue(registry.report()["types"]["snapshot"])
+
+    def test_fingerprint(self):
+        """The fingerprint changes when a source file does."""
+        before = Registry(self.resources).fingerprint()
+        self.assertEqual(Registry(self.resources).fingerprint(), before)
+        with open(self.resources / "lemmata.csv", "a", encoding="utf-8") as file:
+            file.write("bhig,beag\n")
+        self.assertNotEqual(Registry(self.resources).fingerprint(), before)
+
+    def test_shared_snapshot(self):
+        """The shared registry loads a snapshot written elsewhere if the environment says so."""
+        path = Path(self.folder.name) / "elsewhere.marshal"
+        Registry(snapshot=path).write_snapshot()
+        shared = Registry._shared
+        try:
+            Registry._shared = None
+            with mock.patch.dict(os.environ, {SNAPSHOT_ENV: str(path)}):
+                registry = Registry.shared()
+            self.assertEqual(registry.snapshot, path)
+            registry.lemmata()
+            self.assertTrue(registry.report()["lemmata"]["snapshot"])
+        finally:
+            Registry._shared = shared
+
+    def test_damaged_snapshot(self):
+        """A snapshot which cannot be read is ignored."""
+        (self.resources / "snapshot.marshal").write_bytes(b"not a snapshot")
+        registry = Registry(self.resources)
+        self.assertIn("bige", registry.lemmata())
+        self.assertNotIn("snapshot", registry.report()["lemmata"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Tests the annotation server over local sockets."""
+import asyncio
+import json
+from pathlib import Path
+import socket
+import tempfile
+import unittest
+from gd_tools.server import Server
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = Server(max_delay=0.05)
+        listener = await self.server.start(port=0)
+        self.port = listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def request(self, *messages, port=None, path=None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port or self.port)
+        responses = []
+        for message in messages:
+            writer.write(json.dumps(message).encode("utf-8") + b"\n")
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+        writer.close()
+        await writer.wait_closed()
+        return responses
+
+    async def test_annotate(self):
+        [response] = await self.request({"op": "annotate", "id": 7,
+                                         "forms": ["ag", "bualadh", "cait"],
+                                         "xpos": ["Sa", "Nv", "Ncpmn"],
+                                         "annotations": ["lemma", "feats", "retag"]})
+        self.assertEqual(7, response["id"])
+        self.assertEqual(["ag", "buail", "cat"], response["lemma"])
+        self.assertEqual({"VerbForm": ["Vnoun"]}, response["feats"][1])
+        self.assertEqual(["ASP"], response["retag"][0])
+
+    async def test_micro_batch(self):
+        """Concurrent requests share a batch but not their preceding XPOS."""
+        requests = [{"op": "annotate", "forms": ["a", "bualadh"], "xpos": ["Dp3sm", "Nv"]},
+                    {"op": "annotate", "forms": ["bualadh"], "xpos": ["Nv"]}] * 4
+        responses = await asyncio.gather(*(self.request(message) for message in requests))
+        for (response,) in responses[0::2]:
+            self.assertEqual({"VerbForm": ["Inf"]}, response["feats"][1])
+        for (response,) in responses[1::2]:
+            self.assertEqual({"VerbForm": ["Vnoun"]}, response["feats"][0])
+        self.assertLess(self.server.batches, len(requests))
+        [stats] = await self.request({"op": "stats"})
+        self.assertEqual(0, stats["queue_depth"])
+        self.assertGreater(stats["mean_batch_requests"], 1)
+        self.assertLessEqual(stats["latency_ms"]["p50"], stats["latency_ms"]["p99"])
+
+    async def test_errors(self):
+        """Bad requests get an error without spoiling the connection or their batch."""
+        responses = await self.request("[]", {"op": "stem"},
+                                       {"op": "annotate", "forms": ["a"], "xpos": []},
+                                       {"op": "annotate", "forms": ["a"], "xpos": ["Zz"],
+                                        "annotations": ["retag"]},
+                                       {"op": "annotate", "forms": ["a"], "xpos": ["Sa"],
+                                        "annotations": 5},
+                                       {"op": "annotate", "forms": ["a"], "xpos": ["Sa"],
+                                        "annotations": [["lemma"]]},
+                                       {"op": "annotate", "forms": ["a"], "xpos": ["Sa"]})
+        self.assertTrue(all("error" in response for response in responses[:6]))
+        self.assertEqual(["a"], responses[6]["lemma"])
+
+    async def test_normalise(self):
+        [response] = await self.request({"op": "normalise", "text": "Bha e mór.\n"})
+        self.assertEqual("Bha e mòr.\n", response["text"])
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "no Unix sockets")
+    async def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = str(Path(folder) / "gd_tools.sock")
+            server = Server()
+            await server.start(path)
+            try:
+                [response] = await self.request({"op": "annotate", "forms": ["cait"],
+                                                 "xpos": ["Ncpmn"]}, path=path)
+            finally:
+                await server.close()
+        self.assertEqual(["cat"], response["lemma"])
+
+if __name__ == '__main__':
+    unittest.main()
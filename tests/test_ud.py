@@ -13,17 +13,32 @@ class TestFeatures(unittest.TestCase):
 
     def test_feats(self):
         """"This is the generic one which calls the featurisers for individual parts of speech"""
-        self.assertEqual({"Tense": ["Pres"]}, self.featuriser.feats("V-p", {}))
-        self.assertEqual({"Mood": ["Cnd"]}, self.featuriser.feats("V-h", {}))
+        self.assertEqual({"Tense": ("Pres",)}, self.featuriser.feats("V-p", {}))
+        self.assertEqual({"Mood": ("Cnd",)}, self.featuriser.feats("V-h", {}))
 
-        self.assertEqual({"PronType": ["Int"]}, self.featuriser.feats("Uq", {}))
-        self.assertEqual({"Case": ["Dat"], "Gender": ["Masc"], "Number": ["Sing"]},
+        self.assertEqual({"PronType": ("Int",)}, self.featuriser.feats("Uq", {}))
+        self.assertEqual({"Case": ("Dat",), "Gender": ("Masc",), "Number": ("Sing",)},
                          self.featuriser.feats("Ncsmd", {}))
-        self.assertEqual({"Case": ["Nom"], "Gender": ["Masc"], "Number": ["Sing"]},
+        self.assertEqual({"Case": ("Nom",), "Gender": ("Masc",), "Number": ("Sing",)},
                          self.featuriser.feats("Aq-smn", {}))
-        self.assertEqual({"Form": ["Emp"], "Gender": ["Masc"], "Number": ["Sing"], "Person": ["3"]},
+        self.assertEqual({"Form": ("Emp",), "Gender": ("Masc",), "Number": ("Sing",),
+                          "Person": ("3",)},
                          self.featuriser.feats("Pp3sm-e", {}))
 
+    def test_feats_table(self):
+        """Results are shared, read-only and do not touch the caller's dictionary."""
+        feats = self.featuriser.feats("Ncsmd", {})
+        self.assertIs(self.featuriser.feats("Ncsmd", {}), feats)
+        with self.assertRaises(TypeError):
+            feats["Case"] = ("Nom",)
+        self.assertEqual(self.featuriser.feats("Ncsmd", {"Typo": ["Yes"]})["Typo"], ("Yes",))
+        self.assertNotIn("Typo", self.featuriser.feats("Ncsmd", {}))
+        self.assertEqual(self.featuriser.feats("Nv", {}, "Ug"), {"VerbForm": ("Inf",)})
+        self.assertEqual(self.featuriser.feats("Nv", {}, "Sa"), {"VerbForm": ("Vnoun",)})
+        given = {"Typo": ["Yes"]}
+        self.assertEqual(self.featuriser.feats("Mc", given), {"NumType": ("Card",), "Typo": ("Yes",)})
+        self.assertEqual(given, {"Typo": ["Yes"]})
+
     def test_feats_adj(self):
         """Checks for predicate (will break) and comparatives/superlatives."""
         self.assertEqual({}, self.featuriser.feats_adj('Ap'))